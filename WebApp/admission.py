@@ -0,0 +1,226 @@
+import importlib
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+# Priority classes: slider-driven requests, and batch/sweep work that can wait
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+# Request threads per gunicorn worker (gunicorn.conf.py runs this many).
+# Admission keeps one of them free, so a request past capacity still gets a
+# thread that turns it away at once rather than waiting unseen in
+# gunicorn's backlog.
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 4))
+
+# Per gunicorn worker: requests admitted at once (fewer than WORKER_THREADS),
+# bulk requests among them, how long an interactive request may wait for a
+# slot [s], and the Retry-After [s] sent when a request is turned away
+ADMISSION_CAPACITY = int(os.environ.get('ADMISSION_CAPACITY', max(1, WORKER_THREADS - 1)))
+ADMISSION_BULK_LIMIT = int(os.environ.get('ADMISSION_BULK_LIMIT', 1))
+INTERACTIVE_WAIT = float(os.environ.get('INTERACTIVE_WAIT', 0.5))
+RETRY_AFTER = int(os.environ.get('RETRY_AFTER', 2))
+
+# Processes per gunicorn worker running bulk work, and how long a request
+# waits for its result [s], well inside gunicorn's 120 s timeout; a job
+# that takes longer is killed along with its process
+COMPUTE_POOL_WORKERS = int(os.environ.get('COMPUTE_POOL_WORKERS', 1))
+COMPUTE_TIMEOUT = float(os.environ.get('COMPUTE_TIMEOUT', 60))
+
+
+class Overloaded(Exception):
+    """A request turned away: status is 429 (its class is at quota) or 503 (server busy)"""
+
+    def __init__(self, message, status=503, retry_after=RETRY_AFTER):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded admission of compute requests by priority class
+
+    At most capacity requests run at once, and at most bulk_limit of them
+    are bulk. Bulk requests never wait: they are rejected with 429 when
+    their quota is used and with 503 when the server is full or interactive
+    requests are waiting. Interactive requests wait up to interactive_wait
+    seconds for a slot before a 503.
+    """
+
+    def __init__(self, capacity=ADMISSION_CAPACITY, bulk_limit=ADMISSION_BULK_LIMIT,
+                 interactive_wait=INTERACTIVE_WAIT):
+        self.capacity = capacity
+        self.bulk_limit = bulk_limit
+        self.interactive_wait = interactive_wait
+        self._condition = threading.Condition()
+        self._waiting = 0
+        self.active = {INTERACTIVE: 0, BULK: 0}
+        self.admitted = {INTERACTIVE: 0, BULK: 0}
+        self.rejected = {INTERACTIVE: 0, BULK: 0}
+
+    def _running(self):
+        return self.active[INTERACTIVE] + self.active[BULK]
+
+    def acquire(self, priority):
+        with self._condition:
+            if priority == BULK:
+                if self.active[BULK] >= self.bulk_limit:
+                    self.rejected[BULK] += 1
+                    raise Overloaded('too many bulk requests in progress, retry later', 429)
+                if self._waiting or self._running() >= self.capacity:
+                    self.rejected[BULK] += 1
+                    raise Overloaded('server busy with interactive requests, retry later')
+            else:
+                self._waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self._running() < self.capacity,
+                                                        timeout=self.interactive_wait)
+                finally:
+                    self._waiting -= 1
+                if not admitted:
+                    self.rejected[INTERACTIVE] += 1
+                    raise Overloaded('server busy, retry later')
+            self.active[priority] += 1
+            self.admitted[priority] += 1
+
+    def release(self, priority):
+        with self._condition:
+            self.active[priority] -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, priority):
+        """Hold a slot of the given priority class for the duration of the block"""
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'capacity': self.capacity,
+                'bulkLimit': self.bulk_limit,
+                'active': dict(self.active),
+                'admitted': dict(self.admitted),
+                'rejected': dict(self.rejected)
+            }
+
+
+def check_capacity(threads=WORKER_THREADS, capacity=ADMISSION_CAPACITY):
+    """Raise ValueError unless admission leaves a request thread free to turn requests away"""
+    if not 1 <= capacity < threads:
+        raise ValueError(f'ADMISSION_CAPACITY ({capacity}) must be at least 1 and below the '
+                         f'{threads} request threads per worker (WORKER_THREADS)')
+
+
+def _register_process(started):
+    started.put(os.getpid())
+
+
+class ComputePool(ProcessPoolExecutor):
+    """Spawned process pool that knows its processes, so a stuck job can be killed
+
+    Every process reports its id as it starts; terminate() kills them all.
+    Futures of the killed jobs fail with BrokenProcessPool.
+    """
+
+    def __init__(self, max_workers):
+        context = multiprocessing.get_context('spawn')
+        self._started = context.SimpleQueue()
+        self.pids = set()
+        super().__init__(max_workers=max_workers, mp_context=context, initializer=_register_process,
+                         initargs=(self._started,))
+
+    def terminate(self):
+        while not self._started.empty():
+            self.pids.add(self._started.get())
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pending = set()
+
+
+def get_pool():
+    """This process's compute pool, created on first use
+
+    Created lazily so every gunicorn worker gets its own pool after the fork.
+    The pool uses spawn, because forking a process that already runs request
+    threads is unsafe.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ComputePool(COMPUTE_POOL_WORKERS)
+            _pool_pid = os.getpid()
+            _pending.clear()
+        return _pool
+
+
+def _discard_pool(pool, terminate=False):
+    """Stop handing work to pool; with terminate, also kill the jobs it is running"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            _pending.clear()
+    if terminate:
+        pool.terminate()
+    else:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _job_done(future):
+    with _pool_lock:
+        _pending.discard(future)
+
+
+def run_in_pool(func, *args, timeout=COMPUTE_TIMEOUT):
+    """Run func(*args) in the compute pool, raising Overloaded if it takes longer than timeout
+
+    Work is never queued: if every pool process is busy, Overloaded is
+    raised at once, since a queued job could not finish in time. A job that
+    times out is killed with the pool, which is replaced, so abandoned work
+    never holds a process the next request needs. func and its arguments
+    must be picklable (module-level functions and plain data).
+    """
+    pool = get_pool()
+    try:
+        with _pool_lock:
+            if len(_pending) >= COMPUTE_POOL_WORKERS:
+                raise Overloaded('compute pool busy, retry later')
+            future = pool.submit(func, *args)
+            _pending.add(future)
+        future.add_done_callback(_job_done)
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        _discard_pool(pool, terminate=True)
+        raise Overloaded(f'computation did not finish within {timeout:g} s, retry later') from None
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise Overloaded('compute pool restarted, retry later') from None
+
+
+def _import_modules(names):
+    for name in names:
+        importlib.import_module(name)
+
+
+def warm_pool(modules=('calculator',)):
+    """Start the compute pool and import modules in it ahead of the first bulk request"""
+    pool = get_pool()
+    for future in [pool.submit(_import_modules, modules) for _ in range(COMPUTE_POOL_WORKERS)]:
+        future.result()
@@ -1,224 +1,83 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
-import pandas as pd
+from flask import Blueprint, Flask, current_app, redirect, render_template, request, jsonify, send_from_directory
+from urllib.parse import urlencode
 import numpy as np
-from sklearn.linear_model import LinearRegression
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import json
+import gc
+import hashlib
+import hmac
 import os
 
-app = Flask(__name__)
+import calculator
+import catalog
+import dataset
+import encoding
+import figures
+import ingest
+import integrator
+import physics
+import regression
+import snapshot
+from calculator import (calculate_single_setup, setup_sight_tape, calculate_batch, rank_shafts, calculate_tolerance,
+                        recommend_spine, canonical_setup_params, setup_cache, ranking_cache)
+from catalog import search_catalog, INDEXED_COLUMNS
+from dataset import get_dataset, reload_dataset, check_for_updates
+from admission import AdmissionController, Overloaded, run_in_pool, INTERACTIVE, BULK
+from figures import create_comparison_plots, compact_setup, FIGURE_TEMPLATES_JSON, COMPACT_DIGITS
+from encoding import (BINARY_MIMETYPE, MIN_COMPRESS_SIZE, COMPRESSIBLE_MIMETYPES, to_builtin, encode_binary,
+                      choose_content_encoding, compress)
+
+bp = Blueprint('calculator', __name__)
+
+# Interactive requests run inline; bulk ones go to the compute pool, and both
+# are admitted within this worker's capacity
+admission = AdmissionController()
 
 # Get the directory where this script is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Load data with absolute paths
-dataset = pd.read_csv(os.path.join(BASE_DIR, "ArrowSpine3.csv"))
-datasetArrowGPIs = pd.read_csv(os.path.join(BASE_DIR, "ArrowGPIs.csv"))
+# Browser/proxy cache lifetimes [s]: GET comparison results (revalidated with
+# their ETag afterwards), the README, and images and static assets
+RESULT_MAX_AGE = int(os.environ.get('RESULT_MAX_AGE', 300))
+README_MAX_AGE = 3600
+STATIC_MAX_AGE = 86400
 
-# Aggregate Linear Regression Values (from notebook analysis)
-aggregateRegValuesSlopeSlope = -0.001
-aggregateRegValuesSlopeIntercept = -0.174
-aggregateRegValuesIntSlope = -3.885
-aggregateRegValuesIntIntercept = 237.637
+# Bearer token of POST /admin/reload; the endpoint is disabled when unset
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
 
-def calculate_speed(initial_velocity, area_cross_section, coefficient_drag, arrow_mass, distance):
-    """Calculate arrow velocity at given distance using drag model"""
-    air_density = 0.0752  # lb/ft^3
-    
-    if isinstance(initial_velocity, (int, float)):
-        runtime = 3
-        time_of_flight = 0
-        distance_traveled = 0
-        acceleration = lambda v: -0.5 * air_density * area_cross_section * coefficient_drag * v**2 / arrow_mass
-        velocity = initial_velocity
-        dt = 0.001
-        
-        for t in range(int(runtime/dt)):
-            velocity += acceleration(velocity) * dt
-            time_of_flight += dt
-            distance_traveled += velocity * dt
-            if distance_traveled >= distance:
-                break
-        return velocity
-    
-    # Handle array input
-    v_list = []
-    for i in range(len(initial_velocity)):
-        velocity = calculate_speed(initial_velocity[i], area_cross_section, 
-                                 coefficient_drag, arrow_mass[i], distance)
-        v_list.append(velocity)
-    return np.array(v_list)
-
-def calculate_time(initial_velocity, area_cross_section, coefficient_drag, arrow_mass, distance):
-    """Calculate time of flight to given distance"""
-    air_density = 0.0752  # lb/ft^3
-    
-    if isinstance(initial_velocity, (int, float)):
-        runtime = 3
-        time_of_flight = 0
-        distance_traveled = 0
-        acceleration = lambda v: -0.5 * air_density * area_cross_section * coefficient_drag * v**2 / arrow_mass
-        velocity = initial_velocity
-        dt = 0.001
-        
-        for t in range(int(runtime/dt)):
-            velocity += acceleration(velocity) * dt
-            time_of_flight += dt
-            distance_traveled += velocity * dt
-            if distance_traveled >= distance:
-                break
-        return time_of_flight
-    
-    # Handle array input
-    t_list = []
-    for i in range(len(initial_velocity)):
-        time = calculate_time(initial_velocity[i], area_cross_section, 
-                            coefficient_drag, arrow_mass[i], distance)
-        t_list.append(time)
-    return np.array(t_list)
-
-def calculate_single_setup(params):
-    """Calculate results for a single arrow setup"""
-    # Extract all parameters with defaults
-    p = {
-        'chosenSpine': float(params.get('spine', 200)),
-        'chosenArrowGPI': float(params.get('arrowGPI', 10.7)),
-        'chosenPoundage': float(params.get('poundage', 71)),
-        'chosenIBO': float(params.get('ibo', 335)),
-        'chosenArrowLength': float(params.get('arrowLength', 28.25)),
-        'chosenNockThroatAdder': float(params.get('nockThroatAdder', 0.5)),
-        'chosenNockWeight': float(params.get('nockWeight', 6)),
-        'chosenArrowWrapWeight': float(params.get('arrowWrapWeight', 0)),
-        'chosenArrowWrapLength': float(params.get('arrowWrapLength', 4)),
-        'chosenFletchDistanceFromShaftEnd': float(params.get('fletchDistance', 0.75)),
-        'chosenFletchNumber': int(params.get('fletchNumber', 4)),
-        'chosenFletchWeight': float(params.get('fletchWeight', 5)),
-        'chosenFletchLength': float(params.get('fletchLength', 2.25)),
-        'chosenFletchHeight': float(params.get('fletchHeight', 0.465)),
-        'chosenDrawLength': float(params.get('drawLength', 29)),
-        'chosenCoefDrag': float(params.get('coefDrag', 2)),
-        'chosenArrowDiam': float(params.get('arrowDiam', 0.166)),
-        'chosenFletchOffset': float(params.get('fletchOffset', 3))
-    }
-    
-    # Calculate poundage range
-    calcPoundage = np.linspace(30, 90, 30)
-    
-    # Calculate optimal point weight
-    calcOpPointWeight = 150 + 25/5 * (-0.252 * p['chosenIBO'] + 81.8 - calcPoundage + 
-                       (aggregateRegValuesSlopeSlope * p['chosenArrowLength'] + 
-                        aggregateRegValuesSlopeIntercept) * p['chosenSpine'] + 
-                       aggregateRegValuesIntSlope * p['chosenArrowLength'] + 
-                       aggregateRegValuesIntIntercept)
-    
-    # Calculate total arrow mass
-    calcTotalArrowMass = (p['chosenNockWeight'] + p['chosenArrowWrapWeight'] + 
-                         p['chosenFletchNumber'] * p['chosenFletchWeight'] + 
-                         p['chosenArrowGPI'] * p['chosenArrowLength'] + calcOpPointWeight)
-    
-    # Calculate FOC
-    totalFletchWeight = p['chosenFletchNumber'] * p['chosenFletchWeight']
-    totalShaftWeight = p['chosenArrowGPI'] * p['chosenArrowLength']
-    
-    centroidNock = p['chosenNockThroatAdder']
-    centroidArrowWrap = p['chosenNockThroatAdder'] + p['chosenArrowWrapLength']/2
-    centroidFletch = p['chosenFletchDistanceFromShaftEnd'] + p['chosenFletchLength']/3
-    centroidShaft = p['chosenNockThroatAdder'] + p['chosenArrowLength']/2
-    centroidPointWeight = p['chosenNockThroatAdder'] + p['chosenArrowLength']
-    
-    arrowLengthTotal = p['chosenArrowLength'] + p['chosenNockThroatAdder']
-    
-    calcFOC = (100 * ((p['chosenNockWeight'] * centroidNock + 
-                      p['chosenArrowWrapWeight'] * centroidArrowWrap + 
-                      totalFletchWeight * centroidFletch + 
-                      totalShaftWeight * centroidShaft + 
-                      calcOpPointWeight * centroidPointWeight) / calcTotalArrowMass - 
-                     arrowLengthTotal/2)) / arrowLengthTotal
-    
-    # Calculate kinetic energy and FPS
-    calcKENominal = 0.5 * ((350/15.43)/1000) * ((p['chosenIBO'] - 10*(30-p['chosenDrawLength']) - 
-                                                 2*(70-calcPoundage)) * 0.3048)**2
-    calcFPS = np.sqrt(calcKENominal * 2 / ((calcTotalArrowMass/15.43)/1000)) / 0.3048
-    calcKE = 0.5 * ((calcTotalArrowMass/15.43)/1000) * (calcFPS * 0.3048)**2
-    calcMomentum = ((calcTotalArrowMass/15.43)/1000) * (calcFPS * 0.3048)
-    
-    # Calculate arrow cross-sectional area
-    area_cross_section = (np.pi * ((p['chosenArrowDiam']/12)/2)**2 + 
-                         p['chosenFletchNumber'] * 0.5 * p['chosenFletchLength']/12 * 
-                         p['chosenFletchHeight']/12 * p['chosenFletchOffset']/90)
-    
-    # Calculate velocities at different distances
-    calcFPS20yd = calculate_speed(calcFPS, area_cross_section, p['chosenCoefDrag'], 
-                                 calcTotalArrowMass/7000, 60)
-    calcFPS40yd = calculate_speed(calcFPS, area_cross_section, p['chosenCoefDrag'], 
-                                 calcTotalArrowMass/7000, 120)
-    calcFPS60yd = calculate_speed(calcFPS, area_cross_section, p['chosenCoefDrag'], 
-                                 calcTotalArrowMass/7000, 180)
-    
-    # Calculate time of flight at different distances
-    calcTOF20yd = calculate_time(calcFPS, area_cross_section, p['chosenCoefDrag'], 
-                                calcTotalArrowMass/7000, 60)
-    calcTOF40yd = calculate_time(calcFPS, area_cross_section, p['chosenCoefDrag'], 
-                                calcTotalArrowMass/7000, 120)
-    calcTOF60yd = calculate_time(calcFPS, area_cross_section, p['chosenCoefDrag'], 
-                                calcTotalArrowMass/7000, 180)
-    
-    # Calculate KE at different distances
-    calcKE20yd = 0.5 * ((calcTotalArrowMass/15.43)/1000) * (calcFPS20yd * 0.3048)**2
-    calcKE40yd = 0.5 * ((calcTotalArrowMass/15.43)/1000) * (calcFPS40yd * 0.3048)**2
-    calcKE60yd = 0.5 * ((calcTotalArrowMass/15.43)/1000) * (calcFPS60yd * 0.3048)**2
-    
-    # Calculate momentum at different distances
-    calcMomentum20yd = ((calcTotalArrowMass/15.43)/1000) * (calcFPS20yd * 0.3048)
-    calcMomentum40yd = ((calcTotalArrowMass/15.43)/1000) * (calcFPS40yd * 0.3048)
-    calcMomentum60yd = ((calcTotalArrowMass/15.43)/1000) * (calcFPS60yd * 0.3048)
-    
-    # Calculate single point values for selected poundage
-    selectedPoundage = p['chosenPoundage']
-    idx = np.argmin(np.abs(calcPoundage - selectedPoundage))
-    
-    return {
-        'data': {
-            'calcPoundage': calcPoundage,
-            'calcOpPointWeight': calcOpPointWeight,
-            'calcTotalArrowMass': calcTotalArrowMass,
-            'calcFOC': calcFOC,
-            'calcKE': calcKE,
-            'calcFPS': calcFPS,
-            'calcMomentum': calcMomentum,
-            'calcFPS20yd': calcFPS20yd,
-            'calcFPS40yd': calcFPS40yd,
-            'calcFPS60yd': calcFPS60yd,
-            'calcTOF20yd': calcTOF20yd,
-            'calcTOF40yd': calcTOF40yd,
-            'calcTOF60yd': calcTOF60yd,
-            'calcKE20yd': calcKE20yd,
-            'calcKE40yd': calcKE40yd,
-            'calcKE60yd': calcKE60yd,
-            'calcMomentum20yd': calcMomentum20yd,
-            'calcMomentum40yd': calcMomentum40yd,
-            'calcMomentum60yd': calcMomentum60yd
-        },
-        'values': {
-            'optimalPointWeight': float(calcOpPointWeight[idx]),
-            'totalArrowMass': float(calcTotalArrowMass[idx]),
-            'foc': float(calcFOC[idx]),
-            'fps': float(calcFPS[idx]),
-            'ke': float(calcKE[idx]),
-            'momentum': float(calcMomentum[idx])
-        }
-    }
-
-@app.route('/')
+def source_digest(*modules):
+    """Digest of the modules' source files: results computed by them change only with it"""
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+# Part of every result ETag, with the dataset version, so a deploy with
+# changed physics or encoding, or a reloaded spine chart, never revalidates a
+# response of the previous one
+SOURCE_VERSION = source_digest(calculator, physics, integrator, figures, encoding, regression, catalog, dataset,
+                               snapshot, ingest)
+
+@bp.before_app_request
+def pick_up_data_changes():
+    """Swap in edited data files (checked every DATA_CHECK_INTERVAL) before handling a request"""
+    try:
+        if check_for_updates():
+            # Entries of the old version can no longer be hit; free them
+            setup_cache.clear()
+            ranking_cache.clear()
+    except (OSError, ValueError) as e:
+        current_app.logger.warning('Data files not reloaded, keeping version %s: %s',
+                                   get_dataset().version, e)
+
+@bp.route('/')
 def index():
     return render_template('index_plotly.html')
 
-@app.route('/static/<path:path>')
+@bp.route('/static/<path:path>')
 def send_static(path):
     return send_from_directory('static', path)
 
-@app.route('/images/<path:filename>')
+@bp.route('/images/<path:filename>')
 def send_image(filename):
     """Serve images from current directory or parent directory"""
     # First try current directory
@@ -228,10 +87,13 @@ def send_image(filename):
     parent_dir = os.path.dirname(BASE_DIR)
     return send_from_directory(parent_dir, filename)
 
-@app.route('/readme')
-def get_readme():
-    """Serve README.md content"""
-    try:
+# README text and its ETag, read from disk once per process
+_readme = None
+
+def load_readme():
+    """README content and ETag, read on first use"""
+    global _readme
+    if _readme is None:
         # Try to read the main README first (copied from parent directory)
         readme_path = os.path.join(BASE_DIR, 'README_main.md')
         if not os.path.exists(readme_path):
@@ -240,611 +102,376 @@ def get_readme():
         
         with open(readme_path, 'r', encoding='utf-8') as f:
             content = f.read()
-        return jsonify({'success': True, 'content': content})
+        _readme = (content, hashlib.sha256(content.encode('utf-8')).hexdigest()[:32])
+    return _readme
+
+@bp.route('/readme')
+def get_readme():
+    """Serve README.md content"""
+    try:
+        content, etag = load_readme()
+        matched = matching_etag(etag)
+        if matched:
+            return cacheable(current_app.response_class(status=304), matched, README_MAX_AGE)
+        return cacheable(jsonify({'success': True, 'content': content}), etag, README_MAX_AGE)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/calculate_comparison', methods=['POST'])
+@bp.route('/cache_stats')
+def cache_stats():
+    """Hit/miss/eviction counters of this worker's result caches"""
+    return jsonify({
+        'success': True,
+        'setups': setup_cache.stats(),
+        'rankings': ranking_cache.stats(),
+        'admission': admission.stats(),
+        'dataset': get_dataset().summary()
+    })
+
+@bp.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Reload the shaft catalog and spine chart now, in this worker
+
+    Needs "Authorization: Bearer <ADMIN_TOKEN>". With "force": true the
+    files are re-read even if they look unchanged. Invalid files are
+    rejected with 400 and the current data stays. Other workers pick the
+    change up on their next file check.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'reload is disabled, set ADMIN_TOKEN to enable it'}), 403
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(supplied.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({'success': False, 'error': 'invalid admin token'}), 401
+    try:
+        summary = reload_dataset(force=bool((request.get_json(silent=True) or {}).get('force')))
+    except (OSError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e), 'version': get_dataset().version}), 400
+    if summary['changed']:
+        setup_cache.clear()
+        ranking_cache.clear()
+    return jsonify({'success': True, **summary})
+
+@bp.after_app_request
+def compress_response(response):
+    """Compress sizeable JSON/binary/text responses with brotli or gzip as the client accepts"""
+    if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers or
+            response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    content_encoding = choose_content_encoding(request.accept_encodings)
+    body = response.get_data()
+    if content_encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return response
+    response.set_data(compress(body, content_encoding))
+    response.headers['Content-Encoding'] = content_encoding
+    # A strong ETag names one byte sequence, so each encoding gets its own
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{content_encoding}')
+    return response
+
+def matching_etag(etag):
+    """The tag in the request's If-None-Match naming etag in any content encoding, or None"""
+    if_none_match = request.if_none_match
+    if if_none_match.star_tag:
+        return etag
+    return next((tag for tag in if_none_match.as_set(include_weak=True) if tag.split('-')[0] == etag), None)
+
+def cacheable(response, etag, max_age):
+    """Mark a response (or its 304) as publicly cacheable for max_age seconds under etag"""
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.vary.add('Accept-Encoding')
+    return response
+
+def array_response(payload, digits=None):
+    """Response for a payload holding NumPy arrays, in the encoding the client asked for
+
+    Clients accepting BINARY_MIMETYPE get the arrays as raw little-endian
+    buffers (float32 with ?precision=float32, else float64); everyone else
+    gets JSON, with floats rounded to digits significant digits if given.
+    """
+    if request.accept_mimetypes.best_match(['application/json', BINARY_MIMETYPE]) == BINARY_MIMETYPE:
+        dtype = np.float32 if request.args.get('precision') == 'float32' else np.float64
+        return current_app.response_class(encode_binary(payload, dtype), mimetype=BINARY_MIMETYPE)
+    return jsonify(to_builtin(payload, digits))
+
+def overloaded_response(e):
+    """Fast rejection of a request the server has no capacity for"""
+    return jsonify({'success': False, 'error': str(e)}), e.status, {'Retry-After': str(e.retry_after)}
+
+def setup_response(results):
+    """Per-setup part of a response: selected values plus the flight profile if requested"""
+    response = {'values': results['values']}
+    if 'profile' in results:
+        response['profile'] = results['profile']
+    return response
+
+@bp.route('/figure_templates')
+def figure_templates():
+    """Static layout, trace styling and data bindings of every comparison figure"""
+    return current_app.response_class(FIGURE_TEMPLATES_JSON, mimetype='application/json')
+
+def comparison_response(setup1_results, setup2_results, mode=None, seq=None):
+    """Comparison of two computed setups: data only with mode 'data', else with figures"""
+    if mode == 'data':
+        return array_response({
+            'success': True,
+            'seq': seq,
+            'setup1': {**setup_response(setup1_results),
+                       **compact_setup(setup1_results['data'], setup1_results['selected'])},
+            'setup2': {**setup_response(setup2_results),
+                       **compact_setup(setup2_results['data'], setup2_results['selected'])}
+        }, digits=COMPACT_DIGITS)
+    
+    # Create comparison plots
+    comparison_plots = create_comparison_plots(
+        setup1_results['data'], setup2_results['data'],
+        setup1_results['selected'], setup2_results['selected']
+    )
+    
+    return array_response({
+        'success': True,
+        'seq': seq,
+        'setup1': setup_response(setup1_results),
+        'setup2': setup_response(setup2_results),
+        'plots': comparison_plots
+    })
+
+# Options of the GET comparison besides the setups' "setup1.<key>"/"setup2.<key>"
+# parameters, with their accepted values
+COMPARISON_OPTIONS = {'mode': ('data',), 'precision': ('float32', 'float64')}
+
+def comparison_query(args):
+    """Parse the query of a GET comparison
+
+    Returns both setups' parameters, the options and the canonical query
+    string: parameters in canonical_setup_params form, sorted, with defaults
+    left out.
+    """
+    setups = {'setup1': {}, 'setup2': {}}
+    options = {}
+    for key in args:
+        values = args.getlist(key)
+        prefix, _, name = key.partition('.')
+        if key in COMPARISON_OPTIONS:
+            if values[-1] not in COMPARISON_OPTIONS[key]:
+                raise ValueError(f'{key} must be one of {", ".join(COMPARISON_OPTIONS[key])}')
+            options[key] = values[-1]
+        elif prefix in setups and name:
+            setups[prefix][name] = values if name == 'distances' else values[-1]
+        else:
+            raise ValueError(f'unknown query parameter {key!r}, use setup1.<key> or setup2.<key>')
+    
+    if options.get('precision') == 'float64':
+        del options['precision']
+    pairs = [(f'{prefix}.{key}', value) for prefix, params in setups.items()
+             for key, value in canonical_setup_params(params)]
+    return setups, options, urlencode(pairs + sorted(options.items()))
+
+@bp.route('/calculate_comparison', methods=['GET'])
+def calculate_comparison_get():
+    """Cacheable form of the comparison, a pure function of its query string
+
+    Setup parameters are passed as setup1.<key>/setup2.<key>, with mode and
+    precision as in the POST form. Non-canonical queries are redirected to
+    the canonical one, so caches see one URL per result. The redirect is a
+    temporary 302: the canonical form leaves out parameters at their
+    current defaults, so it can change when a default does. The strong
+    ETag is derived from the canonical query, the representation and the
+    code version, and If-None-Match is answered with 304 before any
+    computation.
+    """
+    try:
+        setups, options, query = comparison_query(request.args)
+        if request.query_string.decode('utf-8') != query:
+            return redirect(f'{request.path}?{query}' if query else request.path, 302)
+        
+        current = get_dataset()
+        binary = request.accept_mimetypes.best_match(['application/json', BINARY_MIMETYPE]) == BINARY_MIMETYPE
+        etag = hashlib.sha256(f'{SOURCE_VERSION}:{current.version}?{query}:{binary}'.encode('utf-8')).hexdigest()[:32]
+        matched = matching_etag(etag)
+        if matched:
+            response = cacheable(current_app.response_class(status=304), matched, RESULT_MAX_AGE)
+        else:
+            with admission.admit(INTERACTIVE):
+                setup1_results = calculate_single_setup(setups['setup1'], current.spineModel)
+                setup2_results = calculate_single_setup(setups['setup2'], current.spineModel)
+            response = cacheable(comparison_response(setup1_results, setup2_results, options.get('mode')),
+                                 etag, RESULT_MAX_AGE)
+        response.vary.add('Accept')
+        return response
+        
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@bp.route('/calculate_comparison', methods=['POST'])
 def calculate_comparison():
-    """Handle comparison calculations for two setups"""
+    """Handle comparison calculations for two setups
+
+    With "mode": "data" only the numeric series and selected points are
+    returned, for clients that hold the /figure_templates themselves.
+    The response echoes the request's "seq" number, so the client can ignore
+    anything older than what it already shows; superseding is left to the
+    client, which keeps one request in flight.
+    """
     try:
         data = request.json
+        seq = data.get('seq')
         
         # Calculate for both setups
         setup1_params = data.get('setup1', {})
         setup2_params = data.get('setup2', {})
         
-        setup1_results = calculate_single_setup(setup1_params)
-        setup2_results = calculate_single_setup(setup2_params)
+        spineModel = get_dataset().spineModel
+        with admission.admit(INTERACTIVE):
+            setup1_results = calculate_single_setup(setup1_params, spineModel)
+            setup2_results = calculate_single_setup(setup2_params, spineModel)
         
-        # Create comparison plots
-        comparison_plots = create_comparison_plots(
-            setup1_results['data'], setup2_results['data'],
-            setup1_params, setup2_params
-        )
-        
-        return jsonify({
-            'success': True,
-            'setup1': {
-                'values': setup1_results['values']
-            },
-            'setup2': {
-                'values': setup2_results['values']
-            },
-            'plots': comparison_plots
-        })
+        return comparison_response(setup1_results, setup2_results, data.get('mode'), seq)
         
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def create_comparison_plots(data1, data2, params1, params2):
-    """Create comparison plots showing both setups using Plotly"""
-    plots = {}
-    
-    # Extract data for both setups
-    calcPoundage = data1['calcPoundage']
-    
-    # Find indices for current poundage values
-    idx1 = np.argmin(np.abs(calcPoundage - params1['poundage']))
-    idx2 = np.argmin(np.abs(calcPoundage - params2['poundage']))
-    
-    # Define colors
-    color1 = '#1976D2'
-    color2 = '#FF9800'
-    
-    # Create all plots with larger fonts and clearer styling
-    default_layout = dict(
-        font=dict(size=12),
-        xaxis=dict(
-            title_font=dict(size=14), 
-            tickfont=dict(size=11),
-            showgrid=True,
-            gridcolor='lightgray',
-            showline=True,
-            linewidth=1,
-            linecolor='black',
-            zeroline=True,
-            zerolinewidth=1,
-            zerolinecolor='black'
-        ),
-        yaxis=dict(
-            title_font=dict(size=14), 
-            tickfont=dict(size=11),
-            showgrid=True,
-            gridcolor='lightgray',
-            showline=True,
-            linewidth=1,
-            linecolor='black',
-            zeroline=True,
-            zerolinewidth=1,
-            zerolinecolor='black'
-        ),
-        title_font=dict(size=16),
-        showlegend=False,  # Default to no legend
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        hovermode=False,  # Disable hover tooltips
-        margin=dict(l=60, r=20, t=50, b=50)  # Reduced right margin for larger plots
-    )
-    
-    # Layout for plots with distance legends
-    distance_legend_layout = dict(
-        font=dict(size=12),
-        xaxis=dict(
-            title_font=dict(size=14), 
-            tickfont=dict(size=11),
-            showgrid=True,
-            gridcolor='lightgray',
-            showline=True,
-            linewidth=1,
-            linecolor='black',
-            zeroline=True,
-            zerolinewidth=1,
-            zerolinecolor='black'
-        ),
-        yaxis=dict(
-            title_font=dict(size=14), 
-            tickfont=dict(size=11),
-            showgrid=True,
-            gridcolor='lightgray',
-            showline=True,
-            linewidth=1,
-            linecolor='black',
-            zeroline=True,
-            zerolinewidth=1,
-            zerolinecolor='black'
-        ),
-        title_font=dict(size=16),
-        showlegend=True,
-        legend=dict(
-            font=dict(size=12),
-            orientation="h",
-            yanchor="top",
-            y=-0.15,
-            xanchor="center",
-            x=0.5
-        ),
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        hovermode=False,  # Disable hover tooltips
-        margin=dict(l=60, r=20, t=50, b=80)  # Reduced right margin, extra bottom for legend
-    )
-    
-    # 1. Optimal Point Weight Plot
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcOpPointWeight'], 
-                            mode='lines', name='Setup 1', 
-                            line=dict(color=color1, width=3)))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcOpPointWeight'], 
-                            mode='lines', name='Setup 2', 
-                            line=dict(color=color2, width=3)))
-    
-    # Add current points
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx1]], y=[data1['calcOpPointWeight'][idx1]], 
-                            mode='markers+text', name='Current 1',
-                            marker=dict(color=color1, size=15),
-                            text=[f"{data1['calcOpPointWeight'][idx1]:.0f}gr"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color1),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx2]], y=[data2['calcOpPointWeight'][idx2]], 
-                            mode='markers+text', name='Current 2',
-                            marker=dict(color=color2, size=15),
-                            text=[f"{data2['calcOpPointWeight'][idx2]:.0f}gr"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color2),
-                            showlegend=False))
-    
-    fig.update_layout(title="Poundage vs Optimal Point Weight [grains]",
-                     xaxis_title="Poundage", yaxis_title="Point Weight [gr]",
-                     **default_layout)
-    plots['pointWeight'] = fig.to_json()
-    
-    # 2. Total Arrow Mass Plot
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcTotalArrowMass'], 
-                            mode='lines', name='Setup 1', 
-                            line=dict(color=color1, width=3)))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcTotalArrowMass'], 
-                            mode='lines', name='Setup 2', 
-                            line=dict(color=color2, width=3)))
-    
-    # Add current points
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx1]], y=[data1['calcTotalArrowMass'][idx1]], 
-                            mode='markers+text', name='Current 1',
-                            marker=dict(color=color1, size=15),
-                            text=[f"{data1['calcTotalArrowMass'][idx1]:.0f}gr"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color1),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx2]], y=[data2['calcTotalArrowMass'][idx2]], 
-                            mode='markers+text', name='Current 2',
-                            marker=dict(color=color2, size=15),
-                            text=[f"{data2['calcTotalArrowMass'][idx2]:.0f}gr"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color2),
-                            showlegend=False))
-    
-    fig.update_layout(title="Poundage vs Total Arrow Mass [grains]",
-                     xaxis_title="Poundage", yaxis_title="Total Mass [gr]",
-                     **default_layout)
-    plots['totalMass'] = fig.to_json()
-    
-    # 3. FOC Plot with bands
-    fig = go.Figure()
-    
-    # Add FOC bands
-    fig.add_shape(type="rect", x0=30, x1=90, y0=0, y1=12,
-                  fillcolor="red", opacity=0.3, layer="below", line_width=0)
-    fig.add_shape(type="rect", x0=30, x1=90, y0=12, y1=19,
-                  fillcolor="#90CAF9", opacity=0.3, layer="below", line_width=0)
-    fig.add_shape(type="rect", x0=30, x1=90, y0=19, y1=30,
-                  fillcolor="#42A5F5", opacity=0.3, layer="below", line_width=0)
-    fig.add_shape(type="rect", x0=30, x1=90, y0=30, y1=35,
-                  fillcolor="#1E88E5", opacity=0.3, layer="below", line_width=0)
-    
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcFOC'], 
-                            mode='lines', name='Setup 1', 
-                            line=dict(color=color1, width=3)))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcFOC'], 
-                            mode='lines', name='Setup 2', 
-                            line=dict(color=color2, width=3)))
-    
-    # Add current points
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx1]], y=[data1['calcFOC'][idx1]], 
-                            mode='markers+text', name='Current 1',
-                            marker=dict(color=color1, size=15),
-                            text=[f"{data1['calcFOC'][idx1]:.1f}%"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color1),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx2]], y=[data2['calcFOC'][idx2]], 
-                            mode='markers+text', name='Current 2',
-                            marker=dict(color=color2, size=15),
-                            text=[f"{data2['calcFOC'][idx2]:.1f}%"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color2),
-                            showlegend=False))
-    
-    fig.update_layout(title="Poundage vs FOC [%]",
-                     xaxis_title="Poundage", yaxis_title="FOC [%]",
-                     yaxis_range=[0, 35],
-                     **default_layout)
-    plots['foc'] = fig.to_json()
-    
-    # 4. FPS Plot with distance lines
-    fig = go.Figure()
-    
-    # Add a dummy trace for the legend
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='0yd', line=dict(color='gray', width=3),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='20yd', line=dict(color='gray', width=2, dash='dash'),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='40yd', line=dict(color='gray', width=2, dash='dashdot'),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='60yd', line=dict(color='gray', width=2, dash='dot'),
-                            showlegend=True))
-    
-    # Setup 1 lines
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcFPS'], 
-                            mode='lines', name='Setup 1 (0yd)', 
-                            line=dict(color=color1, width=3),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcFPS20yd'], 
-                            mode='lines', name='Setup 1 (20yd)', 
-                            line=dict(color=color1, width=2, dash='dash'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcFPS40yd'], 
-                            mode='lines', name='Setup 1 (40yd)', 
-                            line=dict(color=color1, width=2, dash='dashdot'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcFPS60yd'], 
-                            mode='lines', name='Setup 1 (60yd)', 
-                            line=dict(color=color1, width=2, dash='dot'),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    # Setup 2 lines
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcFPS'], 
-                            mode='lines', name='Setup 2 (0yd)', 
-                            line=dict(color=color2, width=3),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcFPS20yd'], 
-                            mode='lines', name='Setup 2 (20yd)', 
-                            line=dict(color=color2, width=2, dash='dash'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcFPS40yd'], 
-                            mode='lines', name='Setup 2 (40yd)', 
-                            line=dict(color=color2, width=2, dash='dashdot'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcFPS60yd'], 
-                            mode='lines', name='Setup 2 (60yd)', 
-                            line=dict(color=color2, width=2, dash='dot'),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    # Add current points
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx1]], y=[data1['calcFPS'][idx1]], 
-                            mode='markers+text', 
-                            marker=dict(color=color1, size=15),
-                            text=[f"{data1['calcFPS'][idx1]:.0f}fps"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color1),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx2]], y=[data2['calcFPS'][idx2]], 
-                            mode='markers+text',
-                            marker=dict(color=color2, size=15),
-                            text=[f"{data2['calcFPS'][idx2]:.0f}fps"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color2),
-                            showlegend=False))
-    
-    # Add 60yd points with labels
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx1]], y=[data1['calcFPS60yd'][idx1]], 
-                            mode='markers+text',
-                            marker=dict(color=color1, size=10),
-                            text=[f"{data1['calcFPS60yd'][idx1]:.0f}"],
-                            textposition="bottom center",
-                            textfont=dict(size=11, color=color1),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx2]], y=[data2['calcFPS60yd'][idx2]], 
-                            mode='markers+text',
-                            marker=dict(color=color2, size=10),
-                            text=[f"{data2['calcFPS60yd'][idx2]:.0f}"],
-                            textposition="bottom center",
-                            textfont=dict(size=11, color=color2),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    fig.update_layout(title="Poundage vs FPS",
-                     xaxis_title="Poundage", yaxis_title="FPS",
-                     **distance_legend_layout)
-    plots['fps'] = fig.to_json()
-    
-    # 5. Kinetic Energy Plot with distance lines and bands
-    fig = go.Figure()
-    
-    # Add KE bands
-    fig.add_shape(type="rect", x0=30, x1=90, y0=0, y1=35,
-                  fillcolor="red", opacity=0.3, layer="below", line_width=0)
-    fig.add_shape(type="rect", x0=30, x1=90, y0=35, y1=55,
-                  fillcolor="#90CAF9", opacity=0.3, layer="below", line_width=0)
-    fig.add_shape(type="rect", x0=30, x1=90, y0=55, y1=88,
-                  fillcolor="#42A5F5", opacity=0.3, layer="below", line_width=0)
-    fig.add_shape(type="rect", x0=30, x1=90, y0=88, y1=150,
-                  fillcolor="#1E88E5", opacity=0.3, layer="below", line_width=0)
-    
-    # Add dummy traces for legend
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='0yd', line=dict(color='gray', width=3),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='20yd', line=dict(color='gray', width=2, dash='dash'),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='40yd', line=dict(color='gray', width=2, dash='dashdot'),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='60yd', line=dict(color='gray', width=2, dash='dot'),
-                            showlegend=True))
-    
-    # Setup 1 KE lines
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcKE'], 
-                            mode='lines', name='Setup 1 (0yd)', 
-                            line=dict(color=color1, width=3),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcKE20yd'], 
-                            mode='lines', name='Setup 1 (20yd)', 
-                            line=dict(color=color1, width=2, dash='dash'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcKE40yd'], 
-                            mode='lines', name='Setup 1 (40yd)', 
-                            line=dict(color=color1, width=2, dash='dashdot'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcKE60yd'], 
-                            mode='lines', name='Setup 1 (60yd)', 
-                            line=dict(color=color1, width=2, dash='dot'),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    # Setup 2 KE lines
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcKE'], 
-                            mode='lines', name='Setup 2 (0yd)', 
-                            line=dict(color=color2, width=3),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcKE20yd'], 
-                            mode='lines', name='Setup 2 (20yd)', 
-                            line=dict(color=color2, width=2, dash='dash'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcKE40yd'], 
-                            mode='lines', name='Setup 2 (40yd)', 
-                            line=dict(color=color2, width=2, dash='dashdot'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcKE60yd'], 
-                            mode='lines', name='Setup 2 (60yd)', 
-                            line=dict(color=color2, width=2, dash='dot'),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    # Add current points
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx1]], y=[data1['calcKE'][idx1]], 
-                            mode='markers+text',
-                            marker=dict(color=color1, size=15),
-                            text=[f"{data1['calcKE'][idx1]:.0f}J"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color1),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx2]], y=[data2['calcKE'][idx2]], 
-                            mode='markers+text',
-                            marker=dict(color=color2, size=15),
-                            text=[f"{data2['calcKE'][idx2]:.0f}J"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color2),
-                            showlegend=False))
-    
-    # Add 60yd points with labels
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx1]], y=[data1['calcKE60yd'][idx1]], 
-                            mode='markers+text',
-                            marker=dict(color=color1, size=10),
-                            text=[f"{data1['calcKE60yd'][idx1]:.0f}"],
-                            textposition="bottom center",
-                            textfont=dict(size=11, color=color1),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx2]], y=[data2['calcKE60yd'][idx2]], 
-                            mode='markers+text',
-                            marker=dict(color=color2, size=10),
-                            text=[f"{data2['calcKE60yd'][idx2]:.0f}"],
-                            textposition="bottom center",
-                            textfont=dict(size=11, color=color2),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    fig.update_layout(title="Poundage vs Kinetic Energy [J]",
-                     xaxis_title="Poundage", yaxis_title="KE [J]",
-                     yaxis_range=[0, 150],
-                     **distance_legend_layout)
-    plots['ke'] = fig.to_json()
-    
-    # 6. Momentum Plot with distance lines
-    fig = go.Figure()
-    
-    # Add dummy traces for legend
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='0yd', line=dict(color='gray', width=3),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='20yd', line=dict(color='gray', width=2, dash='dash'),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='40yd', line=dict(color='gray', width=2, dash='dashdot'),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='60yd', line=dict(color='gray', width=2, dash='dot'),
-                            showlegend=True))
-    
-    # Setup 1 momentum lines
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcMomentum'], 
-                            mode='lines', name='Setup 1 (0yd)', 
-                            line=dict(color=color1, width=3),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcMomentum20yd'], 
-                            mode='lines', name='Setup 1 (20yd)', 
-                            line=dict(color=color1, width=2, dash='dash'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcMomentum40yd'], 
-                            mode='lines', name='Setup 1 (40yd)', 
-                            line=dict(color=color1, width=2, dash='dashdot'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcMomentum60yd'], 
-                            mode='lines', name='Setup 1 (60yd)', 
-                            line=dict(color=color1, width=2, dash='dot'),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    # Setup 2 momentum lines
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcMomentum'], 
-                            mode='lines', name='Setup 2 (0yd)', 
-                            line=dict(color=color2, width=3),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcMomentum20yd'], 
-                            mode='lines', name='Setup 2 (20yd)', 
-                            line=dict(color=color2, width=2, dash='dash'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcMomentum40yd'], 
-                            mode='lines', name='Setup 2 (40yd)', 
-                            line=dict(color=color2, width=2, dash='dashdot'),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcMomentum60yd'], 
-                            mode='lines', name='Setup 2 (60yd)', 
-                            line=dict(color=color2, width=2, dash='dot'),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    # Add current points
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx1]], y=[data1['calcMomentum'][idx1]], 
-                            mode='markers+text',
-                            marker=dict(color=color1, size=15),
-                            text=[f"{data1['calcMomentum'][idx1]:.2f}"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color1),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx2]], y=[data2['calcMomentum'][idx2]], 
-                            mode='markers+text',
-                            marker=dict(color=color2, size=15),
-                            text=[f"{data2['calcMomentum'][idx2]:.2f}"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color2),
-                            showlegend=False))
-    
-    # Add 60yd points with labels
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx1]], y=[data1['calcMomentum60yd'][idx1]], 
-                            mode='markers+text',
-                            marker=dict(color=color1, size=10),
-                            text=[f"{data1['calcMomentum60yd'][idx1]:.2f}"],
-                            textposition="bottom center",
-                            textfont=dict(size=11, color=color1),
-                            opacity=0.7,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx2]], y=[data2['calcMomentum60yd'][idx2]], 
-                            mode='markers+text',
-                            marker=dict(color=color2, size=10),
-                            text=[f"{data2['calcMomentum60yd'][idx2]:.2f}"],
-                            textposition="bottom center",
-                            textfont=dict(size=11, color=color2),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    fig.update_layout(title="Poundage vs Momentum [kg·m/s]",
-                     xaxis_title="Poundage", yaxis_title="Momentum",
-                     **distance_legend_layout)
-    plots['momentum'] = fig.to_json()
-    
-    # 7. Time of Flight Plot
-    fig = go.Figure()
-    
-    # Add dummy traces for legend
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='20yd', line=dict(color='gray', width=3),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='40yd', line=dict(color='gray', width=2, dash='dash'),
-                            showlegend=True))
-    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', 
-                            name='60yd', line=dict(color='gray', width=2, dash='dot'),
-                            showlegend=True))
-    
-    # Setup 1 TOF lines
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcTOF20yd'], 
-                            mode='lines', name='Setup 1 (20yd)', 
-                            line=dict(color=color1, width=3),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcTOF40yd'], 
-                            mode='lines', name='Setup 1 (40yd)', 
-                            line=dict(color=color1, width=2, dash='dash'),
-                            opacity=0.8,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data1['calcTOF60yd'], 
-                            mode='lines', name='Setup 1 (60yd)', 
-                            line=dict(color=color1, width=2, dash='dot'),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    # Setup 2 TOF lines
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcTOF20yd'], 
-                            mode='lines', name='Setup 2 (20yd)', 
-                            line=dict(color=color2, width=3),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcTOF40yd'], 
-                            mode='lines', name='Setup 2 (40yd)', 
-                            line=dict(color=color2, width=2, dash='dash'),
-                            opacity=0.8,
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=calcPoundage, y=data2['calcTOF60yd'], 
-                            mode='lines', name='Setup 2 (60yd)', 
-                            line=dict(color=color2, width=2, dash='dot'),
-                            opacity=0.7,
-                            showlegend=False))
-    
-    # Add 60yd points
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx1]], y=[data1['calcTOF60yd'][idx1]], 
-                            mode='markers+text',
-                            marker=dict(color=color1, size=15),
-                            text=[f"{data1['calcTOF60yd'][idx1]:.3f}s"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color1),
-                            showlegend=False))
-    fig.add_trace(go.Scatter(x=[calcPoundage[idx2]], y=[data2['calcTOF60yd'][idx2]], 
-                            mode='markers+text',
-                            marker=dict(color=color2, size=15),
-                            text=[f"{data2['calcTOF60yd'][idx2]:.3f}s"],
-                            textposition="top right",
-                            textfont=dict(size=12, color=color2),
-                            showlegend=False))
-    
-    fig.update_layout(title="Poundage vs Time of Flight [s]",
-                     xaxis_title="Poundage", yaxis_title="Time [s]",
-                     **distance_legend_layout)
-    plots['tof'] = fig.to_json()
-    
-    return plots
+@bp.route('/calculate_batch', methods=['POST'])
+def calculate_batch_route():
+    """Handle bulk calculations for many setups, values only (no figures)"""
+    try:
+        data = request.json or {}
+        with admission.admit(BULK):
+            batch = run_in_pool(calculate_batch, data.get('setups', []), data, get_dataset().spineModel)
+        return array_response({'success': True, **batch})
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/rank_shafts', methods=['POST'])
+def rank_shafts_route():
+    """Rank every catalog shaft for a bow profile by the requested objective"""
+    try:
+        with admission.admit(INTERACTIVE):
+            ranking = rank_shafts(request.json or {})
+        return jsonify({'success': True, **ranking})
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/recommend_spine', methods=['POST'])
+def recommend_spine_route():
+    """Spine needed for a desired point weight over a grid of arrow lengths x poundages"""
+    try:
+        with admission.admit(INTERACTIVE):
+            recommendation = recommend_spine(request.json or {})
+        return array_response({'success': True, **recommendation})
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/spine_models')
+def spine_models():
+    """Point weight models a setup can select with spineModel, and their coefficients"""
+    current = get_dataset()
+    return jsonify({'success': True, 'version': current.version, 'models': list(current.spineModel.names),
+                    'coefficients': current.spineModel.models, 'ibo': current.spineModel.ibo})
+
+@bp.route('/shafts')
+def search_shafts():
+    """Search/autocomplete over the shaft catalog
+
+    q matches shafts by word prefixes of their name, brand and model;
+    <column>.min/<column>.max bound spine, od and gpi (inclusive); brand
+    may be repeated; limit caps the shafts returned (default 20).
+    """
+    try:
+        ranges = {}
+        for column in INDEXED_COLUMNS:
+            low, high = request.args.get(f'{column}.min'), request.args.get(f'{column}.max')
+            ranges[column] = (None if low is None else float(low), None if high is None else float(high))
+        found = search_catalog(get_dataset().catalogIndex, request.args.get('q'), ranges, request.args.getlist('brand'),
+                               int(request.args.get('limit', 20)))
+        return jsonify({'success': True, **found})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@bp.route('/calculate_tolerance', methods=['POST'])
+def calculate_tolerance_route():
+    """Monte Carlo percentile bands of one setup's curves under component tolerances"""
+    try:
+        with admission.admit(BULK):
+            tolerance = run_in_pool(calculate_tolerance, request.json or {}, get_dataset().spineModel)
+        return array_response({'success': True, **tolerance})
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/sight_tape', methods=['POST'])
+def sight_tape():
+    """Sight tape (pin offsets per distance) for one setup over the poundage range"""
+    try:
+        with admission.admit(INTERACTIVE):
+            tape = setup_sight_tape(request.json or {})
+        return array_response({'success': True, **tape})
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def warm_up(app):
+    """Exercise every interactive path once, so the first real request runs at steady-state speed
+
+    Runs the compute, figure, encoding and compression code (paying numpy's
+    and the modules' first-call costs), and fills the setup and ranking
+    caches with the default setup. Bulk work is exercised inline rather than
+    through the compute pool, which each worker starts for itself.
+    """
+    client = app.test_client()
+    setups = {'setup1': {}, 'setup2': {'arrowGPI': 7.1}}
+    client.post('/calculate_comparison', json=setups)
+    client.post('/calculate_comparison', json={**setups, 'mode': 'data'}, headers={'Accept-Encoding': 'gzip'})
+    client.post('/calculate_comparison?precision=float32', json={**setups, 'mode': 'data'},
+                headers={'Accept': BINARY_MIMETYPE})
+    client.post('/rank_shafts', json={})
+    client.post('/recommend_spine', json={'arrowLengthStep': 0.5})
+    client.get('/shafts?q=e&spine.min=300')
+    client.post('/sight_tape', json={})
+    client.get('/figure_templates')
+    client.get('/readme')
+    calculate_batch([{}], {})
+    calculate_tolerance({'samples': 100})
+
+def create_app(warm=True):
+    """Build the app and its shared read-only state
+
+    Designed for gunicorn --preload (see gunicorn.conf.py): called once in the
+    master, so the dataset, the figure templates and the warmed caches are
+    inherited copy-on-write by every forked worker instead of being built
+    per worker.
+    """
+    app = Flask(__name__)
+    # Cache-Control max-age of everything served from disk (/static, /images)
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+    app.register_blueprint(bp)
+    get_dataset()
+    if warm:
+        warm_up(app)
+    # Everything allocated so far lives for the whole process; keep it out of
+    # the collector so collections in the workers don't touch (and copy) its pages
+    gc.collect()
+    gc.freeze()
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
     # For development
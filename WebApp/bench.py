@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""Micro-benchmarks for the calculator compute paths
+
+Run from the WebApp directory: python bench.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from calculator import calculate_single_setup, calculate_batch, compute_single_setup, parse_setup_params, \
+    parse_poundage_grid
+from figures import create_comparison_plots
+from encoding import to_builtin, encode_binary, compress
+
+
+def timed(func, repeat=5):
+    """Best wall time [s] of repeat calls to func"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def random_setups(n, seed=0):
+    """n plausible setups with spine, GPI, poundage, IBO and arrow length varied"""
+    rng = np.random.default_rng(seed)
+    return [{
+        'spine': float(rng.choice([250, 300, 340, 400])),
+        'arrowGPI': float(rng.uniform(7, 12)),
+        'poundage': float(rng.uniform(50, 80)),
+        'ibo': float(rng.uniform(320, 350)),
+        'arrowLength': float(rng.uniform(26, 30)),
+    } for _ in range(n)]
+
+
+def bench_batch():
+    """Throughput of /calculate_batch vs one calculate_single_setup call per setup"""
+    print('Batch evaluation (30-point poundage grid)')
+    print(f'{"setups":>8} {"batch [ms]":>12} {"setups/s":>12} {"per-setup loop [ms]":>20}')
+    for n in (1, 10, 100, 1000, 10000):
+        setups = random_setups(n)
+        batch = timed(lambda: calculate_batch(setups, {}))
+        loop = timed(lambda: [calculate_single_setup(s) for s in setups], repeat=1) if n <= 1000 else float('nan')
+        print(f'{n:>8} {batch * 1e3:>12.2f} {n / batch:>12.0f} {loop * 1e3:>20.2f}')
+
+
+def bench_comparison():
+    """Cost of one /calculate_comparison: the math for two setups vs building the figure JSON"""
+    setup1, setup2 = random_setups(2)
+    calcPoundage = parse_poundage_grid({})
+    math = timed(lambda: [compute_single_setup(parse_setup_params(s), calcPoundage) for s in (setup1, setup2)])
+    r1, r2 = (compute_single_setup(parse_setup_params(s), calcPoundage) for s in (setup1, setup2))
+    figures = timed(lambda: create_comparison_plots(r1['data'], r2['data'], r1['selected'], r2['selected']))
+    print('Comparison (two setups, seven figures)')
+    print(f'{"math [ms]":>12} {"figures [ms]":>14}')
+    print(f'{math * 1e3:>12.2f} {figures * 1e3:>14.2f}')
+
+
+def bench_encoding():
+    """Size and encode time of a 1000-setup /calculate_batch payload per response encoding"""
+    import json
+    batch = calculate_batch(random_setups(1000), {})
+    encodings = {
+        'json': lambda: json.dumps(to_builtin(batch)).encode(),
+        'json+gzip': lambda: compress(json.dumps(to_builtin(batch)).encode(), 'gzip'),
+        'binary float64': lambda: encode_binary(batch),
+        'binary float32': lambda: encode_binary(batch, np.float32),
+        'binary float32+gzip': lambda: compress(encode_binary(batch, np.float32), 'gzip')
+    }
+    print('Response encoding (1000 setups x 30 poundages)')
+    print(f'{"encoding":>20} {"size [kB]":>10} {"encode [ms]":>12}')
+    for name, encode in encodings.items():
+        print(f'{name:>20} {len(encode()) / 1e3:>10.1f} {timed(encode) * 1e3:>12.2f}')
+
+
+def bench_import(repeat=3):
+    """Cold import of the app in a fresh interpreter, as a gunicorn worker boot pays it"""
+    import subprocess
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import app_plotly'], cwd=here, check=True)
+        best = min(best, time.perf_counter() - start)
+    report = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app_plotly'], cwd=here,
+                            check=True, capture_output=True, text=True).stderr
+
+    # Cumulative time of every top-level import of app_plotly and its local modules
+    rows = []
+    for line in report.splitlines()[1:]:
+        _, cumulative, name = line.split('|')
+        if name.startswith(' ' * 3) and not name.startswith(' ' * 4):
+            rows.append((int(cumulative) / 1e3, name.strip()))
+    print(f'Cold start: python -c "import app_plotly" takes {best * 1e3:.0f} ms')
+    print(f'{"module":>20} {"import [ms]":>12}')
+    for cumulative, name in sorted(rows, reverse=True)[:8]:
+        print(f'{name:>20} {cumulative:>12.1f}')
+
+
+if __name__ == '__main__':
+    bench_batch()
+    print()
+    bench_comparison()
+    print()
+    bench_encoding()
+    print()
+    bench_import()
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe, size-bounded least-recently-used cache with hit/miss/eviction counters
+
+    Holds at most maxsize entries and, given sizeof (the approximate bytes
+    of a value), at most maxbytes bytes; a value larger than maxbytes is
+    returned without being stored. Each gunicorn worker holds its own
+    instance, so the counters are per process.
+    """
+
+    def __init__(self, maxsize, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, calling compute() and storing its result on a miss
+
+        compute runs outside the lock, so two threads missing on the same key
+        may both compute it; the second result simply replaces the first.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        if self.maxbytes is not None and size > self.maxbytes:
+            return value
+
+        with self._lock:
+            self.bytes += size - self._sizes.get(key, 0)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+                evicted, _ = self._entries.popitem(last=False)
+                self.bytes -= self._sizes.pop(evicted)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        """Drop every entry; the counters are kept"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Counters, current size and hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'bytes': self.bytes,
+                'maxbytes': self.maxbytes,
+                'hitRate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,756 @@
+import numpy as np
+
+from cache import LRUCache
+from physics import calculate_trajectory, calculate_path, calculate_sight_tape
+from dataset import get_dataset
+from regression import AGGREGATE_MODEL, POUNDAGE_TYPES, FIT_POINT_WEIGHT
+
+# The optimal point weight models fit from the spine chart (a
+# regression.SpineModel) and the shaft catalog come from the current dataset
+# (see dataset.py), which the data files can replace at runtime. Functions
+# take the spineModel or dataset to use, defaulting to the current one, so a
+# request sees one version throughout.
+
+# Downrange checkpoints reported as calcFPS20yd, calcTOF40yd, ... [yd]
+CHECKPOINT_DISTANCES_YD = (20, 40, 60)
+
+# Upper bounds on the number of distances a flight profile and of points a
+# poundage grid may request
+MAX_PROFILE_DISTANCES = 2000
+MAX_POUNDAGE_POINTS = 10000
+
+
+def parse_distance_grid(params):
+    """Return the flight profile distances [yd] requested in params, or None
+
+    Either an explicit list ('distances') or an evenly spaced grid
+    ('distanceStep' with optional 'minDistance'/'maxDistance', default 0-100 yd).
+    """
+    if params.get('distances') is not None:
+        distances = np.asarray(params['distances'], dtype=float).ravel()
+    elif params.get('distanceStep') is not None:
+        step = float(params['distanceStep'])
+        start = float(params.get('minDistance', 0))
+        stop = float(params.get('maxDistance', 100))
+        if not step > 0:
+            raise ValueError('distanceStep must be positive')
+        if (stop - start) / step >= MAX_PROFILE_DISTANCES:
+            raise ValueError(f'a flight profile is limited to {MAX_PROFILE_DISTANCES} distances')
+        distances = np.arange(start, stop + step/2, step)
+    else:
+        return None
+
+    if distances.size > MAX_PROFILE_DISTANCES:
+        raise ValueError(f'a flight profile is limited to {MAX_PROFILE_DISTANCES} distances')
+    if not np.all(np.isfinite(distances)) or np.any(distances < 0):
+        raise ValueError('distances must be finite and non-negative')
+    return distances
+
+
+# Setup parameters: request name -> (name in the p dict, default)
+SETUP_PARAMS = {
+    'spine': ('chosenSpine', 200),
+    'arrowGPI': ('chosenArrowGPI', 10.7),
+    'poundage': ('chosenPoundage', 71),
+    'ibo': ('chosenIBO', 335),
+    'arrowLength': ('chosenArrowLength', 28.25),
+    'nockThroatAdder': ('chosenNockThroatAdder', 0.5),
+    'nockWeight': ('chosenNockWeight', 6),
+    'arrowWrapWeight': ('chosenArrowWrapWeight', 0),
+    'arrowWrapLength': ('chosenArrowWrapLength', 4),
+    'fletchDistance': ('chosenFletchDistanceFromShaftEnd', 0.75),
+    'fletchNumber': ('chosenFletchNumber', 4),
+    'fletchWeight': ('chosenFletchWeight', 5),
+    'fletchLength': ('chosenFletchLength', 2.25),
+    'fletchHeight': ('chosenFletchHeight', 0.465),
+    'drawLength': ('chosenDrawLength', 29),
+    'coefDrag': ('chosenCoefDrag', 2),
+    'arrowDiam': ('chosenArrowDiam', 0.166),
+    'fletchOffset': ('chosenFletchOffset', 3),
+    'pointWeightOffset': ('chosenPointWeightOffset', 0)
+}
+
+
+def parse_setup_params(params, spineModel=None):
+    """Extract all setup parameters with defaults
+
+    'spineModel' (default the aggregate) names the point weight model; p
+    holds its row in spineModel.coefficients.
+    """
+    spineModel = spineModel or get_dataset().spineModel
+    p = {name: float(params.get(key, default)) for key, (name, default) in SETUP_PARAMS.items()}
+    p['chosenFletchNumber'] = int(p['chosenFletchNumber'])
+    p['chosenSpineModel'] = spineModel.index(params.get('spineModel', AGGREGATE_MODEL))
+    return p
+
+
+# Request keys besides SETUP_PARAMS that shape a setup's results (see
+# parse_poundage_grid and parse_distance_grid)
+GRID_PARAMS = ('poundageMin', 'poundageMax', 'poundageResolution', 'distances', 'distanceStep',
+               'minDistance', 'maxDistance')
+
+
+def canonical_number(value):
+    """Shortest text of a number: integral values without a fraction, others as repr(float)"""
+    value = float(value)
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def canonical_setup_params(params):
+    """Sorted (key, text) pairs naming the same setup as params
+
+    Numbers are written by canonical_number and setup parameters at their
+    default are left out, so every spelling of a setup gets the same pairs.
+    'distances' gives one pair per distance, in order. Unknown keys raise
+    ValueError rather than silently falling back to defaults.
+    """
+    pairs = []
+    for key, value in params.items():
+        if key == 'distances':
+            values = value if isinstance(value, (list, tuple)) else [value]
+            pairs.extend((key, canonical_number(distance)) for distance in values)
+        elif key == 'spineModel':
+            if get_dataset().spineModel.index(value) != 0:
+                pairs.append((key, value))
+        elif key in SETUP_PARAMS:
+            if float(value) != SETUP_PARAMS[key][1]:
+                pairs.append((key, canonical_number(value)))
+        elif key in GRID_PARAMS:
+            pairs.append((key, canonical_number(value)))
+        else:
+            raise ValueError(f'unknown setup parameter {key!r}')
+    # A stable sort keeps the distances in their given order
+    return sorted(pairs, key=lambda pair: pair[0])
+
+
+def cross_section_area(p):
+    """Arrow cross-sectional area [ft^2]: shaft plus fletching projected by its offset"""
+    return (np.pi * ((p['chosenArrowDiam']/12)/2)**2 +
+            p['chosenFletchNumber'] * 0.5 * p['chosenFletchLength']/12 *
+            p['chosenFletchHeight']/12 * p['chosenFletchOffset']/90)
+
+
+def parse_poundage_grid(params):
+    """Return the poundage grid [lb] requested in params
+
+    'poundageMin'/'poundageMax' (default 30-90 lb) sampled at
+    'poundageResolution' points (default 30, at most MAX_POUNDAGE_POINTS).
+    """
+    start = float(params.get('poundageMin', 30))
+    stop = float(params.get('poundageMax', 90))
+    resolution = int(params.get('poundageResolution', 30))
+    if not start < stop:
+        raise ValueError('poundageMin must be below poundageMax')
+    if not 2 <= resolution <= MAX_POUNDAGE_POINTS:
+        raise ValueError(f'poundageResolution must be between 2 and {MAX_POUNDAGE_POINTS}')
+    return np.linspace(start, stop, resolution)
+
+
+# Grains of point weight equivalent to a pound of effective poundage, from
+# the manufacturers' charts (25 gr per 5 lb)
+POINT_WEIGHT_PER_POUND = 25/5
+
+
+def optimal_point_weights(p, calcPoundage, spineModel):
+    """Optimal point weight [gr] of the nominal, lower and upper bound poundage fits, in POUNDAGE_TYPES order
+
+    Point weight is linear in spine: FIT_POINT_WEIGHT plus
+    POINT_WEIGHT_PER_POUND for every pound the chart's poundage for the
+    spine and arrow length exceeds the bow's IBO-adjusted poundage.
+    """
+    regValues = spineModel.coefficients[np.asarray(p['chosenSpineModel'], dtype=np.intp)]
+    iboValues = spineModel.ibo
+    minusBowPoundage = -iboValues['slope'] * p['chosenIBO'] - iboValues['intercept'] - calcPoundage
+    return [FIT_POINT_WEIGHT + POINT_WEIGHT_PER_POUND * (
+                minusBowPoundage +
+                (regValues[..., i, 0] * p['chosenArrowLength'] + regValues[..., i, 1]) * p['chosenSpine'] +
+                regValues[..., i, 2] * p['chosenArrowLength'] + regValues[..., i, 3])
+            for i in range(len(POUNDAGE_TYPES))]
+
+
+def required_spines(p, calcPoundage, pointWeight, spineModel):
+    """Spine for which pointWeight [gr] is optimal, per poundage fit: the inverse of optimal_point_weights
+
+    NaN where no positive spine gives that point weight.
+    """
+    regValues = spineModel.coefficients[np.asarray(p['chosenSpineModel'], dtype=np.intp)]
+    iboValues = spineModel.ibo
+    target = ((pointWeight - FIT_POINT_WEIGHT) / POINT_WEIGHT_PER_POUND +
+              iboValues['slope'] * p['chosenIBO'] + iboValues['intercept'] + calcPoundage)
+    spines = []
+    for i in range(len(POUNDAGE_TYPES)):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            spine = ((target - regValues[..., i, 2] * p['chosenArrowLength'] - regValues[..., i, 3]) /
+                     (regValues[..., i, 0] * p['chosenArrowLength'] + regValues[..., i, 1]))
+        spines.append(np.where(np.isfinite(spine) & (spine > 0), spine, np.nan))
+    return spines
+
+
+def evaluate_setup(p, calcPoundage, profileDistances=None, spineModel=None):
+    """Evaluate every series of a setup at the given poundages
+
+    The parameter values in p may be scalars or arrays that broadcast against
+    calcPoundage (e.g. one row per setup), so any number of setups and
+    poundages is evaluated in one vectorized pass. Returns the series dict
+    and the calculate_trajectory result at CHECKPOINT_DISTANCES_YD followed by
+    any profileDistances [yd].
+    """
+    # Calculate optimal point weight from the nominal, lower and upper bound
+    # poundage fits of the setup's model
+    spineModel = spineModel or get_dataset().spineModel
+    calcOpPointWeight, lowerBoundPointWeight, upperBoundPointWeight = optimal_point_weights(p, calcPoundage,
+                                                                                           spineModel)
+    calcOpPointWeightMin = np.minimum(lowerBoundPointWeight, upperBoundPointWeight)
+    calcOpPointWeightMax = np.maximum(lowerBoundPointWeight, upperBoundPointWeight)
+
+    # Point actually installed: the optimal weight plus any deviation from it
+    pointWeight = calcOpPointWeight + p['chosenPointWeightOffset']
+
+    # Calculate total arrow mass
+    calcTotalArrowMass = (p['chosenNockWeight'] + p['chosenArrowWrapWeight'] +
+                         p['chosenFletchNumber'] * p['chosenFletchWeight'] +
+                         p['chosenArrowGPI'] * p['chosenArrowLength'] + pointWeight)
+
+    # Calculate FOC
+    totalFletchWeight = p['chosenFletchNumber'] * p['chosenFletchWeight']
+    totalShaftWeight = p['chosenArrowGPI'] * p['chosenArrowLength']
+
+    centroidNock = p['chosenNockThroatAdder']
+    centroidArrowWrap = p['chosenNockThroatAdder'] + p['chosenArrowWrapLength']/2
+    centroidFletch = p['chosenFletchDistanceFromShaftEnd'] + p['chosenFletchLength']/3
+    centroidShaft = p['chosenNockThroatAdder'] + p['chosenArrowLength']/2
+    centroidPointWeight = p['chosenNockThroatAdder'] + p['chosenArrowLength']
+
+    arrowLengthTotal = p['chosenArrowLength'] + p['chosenNockThroatAdder']
+
+    calcFOC = (100 * ((p['chosenNockWeight'] * centroidNock +
+                      p['chosenArrowWrapWeight'] * centroidArrowWrap +
+                      totalFletchWeight * centroidFletch +
+                      totalShaftWeight * centroidShaft +
+                      pointWeight * centroidPointWeight) / calcTotalArrowMass -
+                     arrowLengthTotal/2)) / arrowLengthTotal
+
+    # Calculate kinetic energy and FPS
+    calcKENominal = 0.5 * ((350/15.43)/1000) * ((p['chosenIBO'] - 10*(30-p['chosenDrawLength']) -
+                                                 2*(70-calcPoundage)) * 0.3048)**2
+    calcFPS = np.sqrt(calcKENominal * 2 / ((calcTotalArrowMass/15.43)/1000)) / 0.3048
+    calcKE = 0.5 * ((calcTotalArrowMass/15.43)/1000) * (calcFPS * 0.3048)**2
+    calcMomentum = ((calcTotalArrowMass/15.43)/1000) * (calcFPS * 0.3048)
+
+    # Calculate arrow cross-sectional area
+    area_cross_section = cross_section_area(p)
+
+    # Evaluate velocity, time of flight, KE and momentum at every checkpoint, and at
+    # every distance of the requested flight profile, in one pass
+    distancesYd = np.array(CHECKPOINT_DISTANCES_YD, dtype=float)
+    if profileDistances is not None:
+        distancesYd = np.concatenate((distancesYd, profileDistances))
+    trajectory = calculate_trajectory(calcFPS, area_cross_section, p['chosenCoefDrag'],
+                                      calcTotalArrowMass, distancesYd * 3)
+
+    data = {
+        'calcPoundage': np.broadcast_to(calcPoundage, calcFOC.shape),
+        'calcOpPointWeight': calcOpPointWeight,
+        'calcOpPointWeightMin': calcOpPointWeightMin,
+        'calcOpPointWeightMax': calcOpPointWeightMax,
+        'calcTotalArrowMass': calcTotalArrowMass,
+        'calcFOC': calcFOC,
+        'calcKE': calcKE,
+        'calcFPS': calcFPS,
+        'calcMomentum': calcMomentum
+    }
+    for i, yards in enumerate(CHECKPOINT_DISTANCES_YD):
+        data[f'calcFPS{yards}yd'] = trajectory['velocity'][i]
+        data[f'calcTOF{yards}yd'] = trajectory['tof'][i]
+        data[f'calcKE{yards}yd'] = trajectory['ke'][i]
+        data[f'calcMomentum{yards}yd'] = trajectory['momentum'][i]
+    return data, trajectory
+
+
+# Memoized setups per gunicorn worker: entries and array bytes kept, and the
+# largest result (poundage points x (1 + profile distances)) worth keeping,
+# about 1 MB
+SETUP_CACHE_SIZE = 512
+SETUP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SETUP_CACHE_MAX_POINTS = 20_000
+
+
+def result_nbytes(value):
+    """Bytes of the arrays in a (nested) results dict"""
+    if isinstance(value, dict):
+        return sum(result_nbytes(item) for item in value.values())
+    return value.nbytes if isinstance(value, np.ndarray) else 0
+
+
+setup_cache = LRUCache(SETUP_CACHE_SIZE, SETUP_CACHE_MAX_BYTES, result_nbytes)
+
+
+def freeze(value):
+    """Make every array in a (nested) results dict read-only, so cached results can be shared"""
+    if isinstance(value, dict):
+        for item in value.values():
+            freeze(item)
+    elif isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    return value
+
+
+def calculate_single_setup(params, spineModel=None):
+    """Calculate results for a single arrow setup
+
+    Results are memoized in setup_cache, keyed on the parsed parameters, the
+    grid bounds and the model version, so an unchanged setup (or a slider moved
+    back to an earlier value) is returned without recomputation. The returned dicts are
+    shared and must not be modified.
+    """
+    spineModel = spineModel or get_dataset().spineModel
+    p = parse_setup_params(params, spineModel)
+    calcPoundage = parse_poundage_grid(params)
+    profileDistances = parse_distance_grid(params)
+
+    points = calcPoundage.size * (1 + (0 if profileDistances is None else profileDistances.size))
+    if points > SETUP_CACHE_MAX_POINTS:
+        return compute_single_setup(p, calcPoundage, profileDistances, spineModel)
+    # linspace is fixed by its ends and count; the profile is at most a few kB
+    key = (spineModel.key, tuple(sorted(p.items())), (calcPoundage[0], calcPoundage[-1], calcPoundage.size),
+           None if profileDistances is None else profileDistances.tobytes())
+    return setup_cache.get_or_compute(
+        key, lambda: freeze(compute_single_setup(p, calcPoundage, profileDistances, spineModel)))
+
+
+def compute_single_setup(p, calcPoundage, profileDistances=None, spineModel=None):
+    """Evaluate a parsed setup over the poundage grid, plus the selected poundage and profile"""
+    # The selected poundage is evaluated exactly, as one extra point after the grid
+    series, trajectory = evaluate_setup(p, np.append(calcPoundage, p['chosenPoundage']), profileDistances,
+                                        spineModel)
+
+    data = {name: values[:-1] for name, values in series.items()}
+    selected = {name: float(values[-1]) for name, values in series.items()}
+
+    results = {
+        'data': data,
+        'selected': selected,
+        'values': {
+            'optimalPointWeight': selected['calcOpPointWeight'],
+            'optimalPointWeightMin': selected['calcOpPointWeightMin'],
+            'optimalPointWeightMax': selected['calcOpPointWeightMax'],
+            'totalArrowMass': selected['calcTotalArrowMass'],
+            'foc': selected['calcFOC'],
+            'fps': selected['calcFPS'],
+            'ke': selected['calcKE'],
+            'momentum': selected['calcMomentum']
+        }
+    }
+
+    # Full flight profile as poundage x distance arrays
+    if profileDistances is not None:
+        n = len(CHECKPOINT_DISTANCES_YD)
+        results['profile'] = {
+            'poundage': calcPoundage,
+            'distance': profileDistances,
+            'fps': trajectory['velocity'][n:, :-1].T,
+            'tof': trajectory['tof'][n:, :-1].T,
+            'ke': trajectory['ke'][n:, :-1].T,
+            'momentum': trajectory['momentum'][n:, :-1].T
+        }
+
+    return results
+
+
+def setup_sight_tape(params, spineModel=None):
+    """Sight tape and per-yard trajectory for a setup over the whole poundage range
+
+    Pins are offset [in] from the pin zeroed at 'zeroDistance' (default 20 yd)
+    for each of 'tapeDistances' (default 10-100 yd every 10 yd), for a pin
+    'sightRadius' [in] in front of an eye 'sightHeight' [in] above the arrow.
+    All launch angles for all poundages and distances are solved in one batch.
+    A pin the arrow can't reach at a poundage is NaN; ValueError is raised if
+    the zero distance is out of reach.
+    """
+    spineModel = spineModel or get_dataset().spineModel
+    p = parse_setup_params(params, spineModel)
+    results = calculate_single_setup(params, spineModel)
+    calcPoundage = results['data']['calcPoundage']
+    calcFPS = results['data']['calcFPS']
+    arrowMass = results['data']['calcTotalArrowMass'] / 7000
+    area_cross_section = cross_section_area(p)
+
+    zeroDistance = float(params.get('zeroDistance', 20))
+    tapeDistances = np.asarray(params.get('tapeDistances', np.arange(10, 101, 10)), dtype=float).ravel()
+    sightRadius = float(params.get('sightRadius', 30))
+    sightHeight = float(params.get('sightHeight', 0))
+    if zeroDistance <= 0 or tapeDistances.size == 0 or np.any(tapeDistances <= 0):
+        raise ValueError('zero and tape distances must be positive')
+    if tapeDistances.size > MAX_PROFILE_DISTANCES:
+        raise ValueError(f'a sight tape is limited to {MAX_PROFILE_DISTANCES} distances')
+
+    pinOffsets, _, zeroSlope = calculate_sight_tape(calcFPS, area_cross_section, p['chosenCoefDrag'], arrowMass,
+                                                   tapeDistances * 3, zeroDistance * 3,
+                                                   sight_radius=sightRadius, sight_height=sightHeight)
+    if np.any(np.isnan(zeroSlope)):
+        raise ValueError(f'zeroDistance {zeroDistance:g} yd is out of the arrow\'s range')
+
+    # Trajectory of the zeroed shot at every yard out to the furthest pin
+    yards = np.arange(0, max(tapeDistances.max(), zeroDistance) + 1)
+    height, _ = calculate_path(calcFPS, area_cross_section, p['chosenCoefDrag'], arrowMass, zeroSlope,
+                               (yards * 3)[:, None])
+    sightLine = sightHeight/12 * (1 - yards * 3 / (zeroDistance * 3))
+
+    order = np.argsort(tapeDistances)
+    return {
+        'calcPoundage': calcPoundage,
+        'tapeDistances': tapeDistances,
+        'pinOffsets': pinOffsets.T,
+        'pinGaps': np.diff(pinOffsets[order], axis=0).T,
+        'zeroAngle': np.degrees(np.arctan(zeroSlope)),
+        'yards': yards,
+        'drop': 12 * (yards[:, None] * 3 * zeroSlope - height).T,
+        'path': 12 * (height - sightLine[:, None]).T
+    }
+
+
+# Bulk evaluation limits: setups per request and setups x poundage points
+MAX_BATCH_SETUPS = 10000
+MAX_BATCH_POINTS = 2_000_000
+
+
+def stack_setup_params(setups, spineModel=None):
+    """Parse a list of setup dicts into one p dict of (n_setups, 1) column arrays"""
+    parsed = [parse_setup_params(setup, spineModel) for setup in setups]
+    return {name: np.array([p[name] for p in parsed], dtype=float)[:, None] for name in parsed[0]}
+
+
+def calculate_batch(setups, params, spineModel=None):
+    """Calculate point weight, mass, FOC, FPS, KE and momentum for many setups at once
+
+    Every setup shares the poundage grid given in params and also gets its own
+    selected poundage evaluated exactly. All setups and poundages go through
+    evaluate_setup as one setups x poundage broadcast, so there is no per-setup
+    Python work beyond parsing the parameters.
+    """
+    if not setups:
+        raise ValueError('at least one setup is required')
+    if len(setups) > MAX_BATCH_SETUPS:
+        raise ValueError(f'a batch is limited to {MAX_BATCH_SETUPS} setups')
+    calcPoundage = parse_poundage_grid(params)
+    if len(setups) * (calcPoundage.size + 1) > MAX_BATCH_POINTS:
+        raise ValueError(f'a batch is limited to {MAX_BATCH_POINTS} setup x poundage points')
+
+    spineModel = spineModel or get_dataset().spineModel
+    p = stack_setup_params(setups, spineModel)
+    poundage = np.concatenate((np.broadcast_to(calcPoundage, (len(setups), calcPoundage.size)),
+                               p['chosenPoundage']), axis=1)
+    series, _ = evaluate_setup(p, poundage, spineModel=spineModel)
+
+    names = {
+        'optimalPointWeight': 'calcOpPointWeight',
+        'optimalPointWeightMin': 'calcOpPointWeightMin',
+        'optimalPointWeightMax': 'calcOpPointWeightMax',
+        'totalArrowMass': 'calcTotalArrowMass',
+        'foc': 'calcFOC',
+        'fps': 'calcFPS',
+        'ke': 'calcKE',
+        'momentum': 'calcMomentum'
+    }
+    return {
+        'calcPoundage': calcPoundage,
+        'data': {name: series[key][:, :-1] for name, key in names.items()},
+        'values': {name: series[key][:, -1] for name, key in names.items()}
+    }
+
+
+# Quantities a catalog ranking can sort by or constrain: series name and
+# whether larger is better
+RANKING_QUANTITIES = {
+    'ke40': ('calcKE40yd', True),
+    'foc': ('calcFOC', True),
+    'tof60': ('calcTOF60yd', False),
+    'momentum': ('calcMomentum', True),
+    'ke': ('calcKE', True),
+    'fps': ('calcFPS', True),
+    'pointWeight': ('calcOpPointWeight', True),
+    'totalArrowMass': ('calcTotalArrowMass', True)
+}
+RANKING_CACHE_SIZE = 256
+
+
+def bow_profile(params, spineModel=None):
+    """Normalized, hashable bow profile: every setup parameter except the shaft's own
+
+    Spine, GPI and diameter come from the catalog, so requests that differ only
+    in those (or in key order, or int vs float) share one profile.
+    """
+    p = parse_setup_params(params, spineModel)
+    for name in ('chosenSpine', 'chosenArrowGPI', 'chosenArrowDiam'):
+        del p[name]
+    return tuple(sorted(p.items()))
+
+
+ranking_cache = LRUCache(RANKING_CACHE_SIZE)
+
+
+def evaluate_catalog(profile, dataset):
+    """Evaluate every catalog shaft of a dataset for one bow profile at its selected poundage, memoized"""
+    return ranking_cache.get_or_compute((dataset.version, profile), lambda: _evaluate_catalog(profile, dataset))
+
+
+def _evaluate_catalog(profile, dataset):
+    catalog = dataset.catalog
+    p = dict(profile)
+    p['chosenSpine'] = catalog['spine']
+    p['chosenArrowGPI'] = catalog['gpi']
+    p['chosenArrowDiam'] = catalog['od']
+    series, _ = evaluate_setup(p, p['chosenPoundage'], spineModel=dataset.spineModel)
+    return freeze({name: series[key] for name, (key, _) in RANKING_QUANTITIES.items()})
+
+
+def rank_shafts(params, dataset=None):
+    """Rank every catalog shaft for a bow profile
+
+    'objective' is one of RANKING_QUANTITIES (default 'ke40'). 'constraints'
+    maps quantities to {'min': ..., 'max': ...}, 'brands' restricts the
+    catalog and 'limit' caps the number of shafts returned (default 10).
+    The catalog evaluation is cached per dataset version and bow profile;
+    filtering and sorting are done per request.
+    """
+    objective = params.get('objective', 'ke40')
+    if objective not in RANKING_QUANTITIES:
+        raise ValueError(f'objective must be one of {", ".join(RANKING_QUANTITIES)}')
+    limit = int(params.get('limit', 10))
+    if limit < 1:
+        raise ValueError('limit must be positive')
+
+    dataset = dataset or get_dataset()
+    catalog = dataset.catalog
+    results = evaluate_catalog(bow_profile(params, dataset.spineModel), dataset)
+
+    keep = np.isfinite(results[objective])
+    for name, bounds in (params.get('constraints') or {}).items():
+        if name not in RANKING_QUANTITIES:
+            raise ValueError(f'unknown constraint {name!r}')
+        if bounds.get('min') is not None:
+            keep &= results[name] >= float(bounds['min'])
+        if bounds.get('max') is not None:
+            keep &= results[name] <= float(bounds['max'])
+    if params.get('brands'):
+        keep &= catalog['brand'].isin(params['brands'])
+
+    candidates = np.flatnonzero(keep)
+    score = results[objective][candidates]
+    if RANKING_QUANTITIES[objective][1]:
+        score = -score
+    order = candidates[np.argsort(score, kind='stable')][:limit]
+
+    return {
+        'objective': objective,
+        'matched': int(candidates.size),
+        'shafts': [{
+            'name': catalog['name'][i],
+            'brand': catalog['brand'][i],
+            'spine': float(catalog['spine'][i]),
+            'od': float(catalog['od'][i]),
+            'gpi': float(catalog['gpi'][i]),
+            **{name: float(values[i]) for name, values in results.items()}
+        } for i in order]
+    }
+
+
+# Upper bound on the arrow lengths x poundages of a spine recommendation
+MAX_RECOMMEND_POINTS = 1_000_000
+
+
+def parse_arrow_length_grid(params, default):
+    """Return the arrow lengths [in] requested in params, or [default]
+
+    Either an explicit list ('arrowLengths') or an evenly spaced grid
+    ('arrowLengthStep' with optional 'arrowLengthMin'/'arrowLengthMax',
+    default 26-31 in).
+    """
+    if params.get('arrowLengths') is not None:
+        arrowLengths = np.asarray(params['arrowLengths'], dtype=float).ravel()
+    elif params.get('arrowLengthStep') is not None:
+        step = float(params['arrowLengthStep'])
+        start = float(params.get('arrowLengthMin', 26))
+        stop = float(params.get('arrowLengthMax', 31))
+        if not step > 0:
+            raise ValueError('arrowLengthStep must be positive')
+        if (stop - start) / step >= MAX_RECOMMEND_POINTS:
+            raise ValueError(f'a spine recommendation is limited to {MAX_RECOMMEND_POINTS} points')
+        arrowLengths = np.arange(start, stop + step/2, step)
+    else:
+        arrowLengths = np.array([default], dtype=float)
+
+    if arrowLengths.size == 0 or not np.all(np.isfinite(arrowLengths)) or np.any(arrowLengths <= 0):
+        raise ValueError('arrow lengths must be positive')
+    return arrowLengths
+
+
+def snap_to_spines(spines, values):
+    """Nearest of the sorted spines to every value (NaN stays NaN)"""
+    upper = np.clip(np.searchsorted(spines, values), 0, spines.size - 1)
+    lower = np.maximum(upper - 1, 0)
+    nearest = np.where(np.abs(values - spines[lower]) <= np.abs(spines[upper] - values), spines[lower],
+                       spines[upper])
+    return np.where(np.isnan(values), np.nan, nearest)
+
+
+def recommend_spine(params, dataset=None):
+    """Spine needed for a desired point weight over a grid of arrow lengths x poundages
+
+    'pointWeight' [gr] (default FIT_POINT_WEIGHT) is the point to shoot; the
+    poundage grid is given as for the other calculations and the arrow
+    lengths as in parse_arrow_length_grid, and 'ibo' and 'spineModel' as
+    for a setup. Since the optimal point weight is linear in spine, every
+    cell is solved in closed form, all at once. Returns [arrow length]
+    [poundage] arrays: the spine the nominal fit asks for
+    ('requiredSpine') and the range the lower and upper bound fits accept
+    ('spineMin'/'spineMax'), NaN where no spine fits. 'snappedSpine' is
+    the nearest spine in the catalog (of 'brands', if given), with its
+    optimal point weight and whether it lies in the accepted range.
+    """
+    dataset = dataset or get_dataset()
+    p = parse_setup_params(params, dataset.spineModel)
+    calcPoundage = parse_poundage_grid(params)
+    arrowLengths = parse_arrow_length_grid(params, p['chosenArrowLength'])
+    if arrowLengths.size * calcPoundage.size > MAX_RECOMMEND_POINTS:
+        raise ValueError(f'a spine recommendation is limited to {MAX_RECOMMEND_POINTS} points')
+    pointWeight = float(params.get('pointWeight', FIT_POINT_WEIGHT))
+    if not pointWeight > 0:
+        raise ValueError('pointWeight must be positive')
+
+    catalog = dataset.catalog
+    keep = catalog['brand'].isin(params['brands']) if params.get('brands') else slice(None)
+    spines = np.unique(catalog['spine'][keep])
+    if spines.size == 0:
+        raise ValueError('no catalog shaft matches the brands')
+
+    p['chosenArrowLength'] = arrowLengths[:, None]
+    requiredSpine, lowerBoundSpine, upperBoundSpine = required_spines(p, calcPoundage, pointWeight,
+                                                                      dataset.spineModel)
+    spineMin = np.minimum(lowerBoundSpine, upperBoundSpine)
+    spineMax = np.maximum(lowerBoundSpine, upperBoundSpine)
+    p['chosenSpine'] = snap_to_spines(spines, requiredSpine)
+    snappedPointWeight = optimal_point_weights(p, calcPoundage, dataset.spineModel)[0]
+
+    return {
+        'calcPoundage': calcPoundage,
+        'arrowLengths': arrowLengths,
+        'pointWeight': pointWeight,
+        'spines': spines,
+        'requiredSpine': requiredSpine,
+        'spineMin': spineMin,
+        'spineMax': spineMax,
+        'snappedSpine': p['chosenSpine'],
+        'snappedPointWeight': snappedPointWeight,
+        'snappedInRange': (p['chosenSpine'] >= spineMin) & (p['chosenSpine'] <= spineMax)
+    }
+
+
+# Monte Carlo tolerance analysis limits and defaults
+MAX_TOLERANCE_SAMPLES = 200_000
+MAX_TOLERANCE_POINTS = 10_000_000
+TOLERANCE_BLOCK_POINTS = 250_000
+TOLERANCE_PERCENTILES = (5, 25, 50, 75, 95)
+TOLERANCE_SERIES = ('calcOpPointWeight', 'calcFOC', 'calcFPS') + \
+    tuple(f'calcKE{yards}yd' for yards in CHECKPOINT_DISTANCES_YD)
+
+
+def sample_tolerances(p, tolerances, samples, rng):
+    """Replace the toleranced parameters of p by (samples,) arrays of random draws
+
+    tolerances maps request parameter names to {'sd': ...} (normal, the default)
+    or {'dist': 'uniform', 'halfWidth': ...}, centred on the parameter's value.
+    """
+    p = dict(p)
+    for key, spec in tolerances.items():
+        if key not in SETUP_PARAMS or key == 'fletchNumber':
+            raise ValueError(f'no tolerance can be given for {key!r}')
+        name = SETUP_PARAMS[key][0]
+        dist = spec.get('dist', 'normal')
+        if dist == 'normal':
+            draws = rng.normal(p[name], float(spec['sd']), samples)
+        elif dist == 'uniform':
+            halfWidth = float(spec['halfWidth'])
+            draws = rng.uniform(p[name] - halfWidth, p[name] + halfWidth, samples)
+        else:
+            raise ValueError(f'unknown distribution {dist!r}, use normal or uniform')
+        p[name] = draws
+    return p
+
+
+def row_percentiles(values, percentiles):
+    """Linearly interpolated percentiles of the finite values along each row of a 2D array
+
+    Same results as np.nanpercentile(values, percentiles, axis=1).T up to
+    float32 rounding: sorting the rows in float32 once is much faster than
+    the repeated float64 partitions np.percentile does for several
+    percentiles. Non-finite values are left out, and a row without finite
+    values gets NaN percentiles.
+    """
+    values = values.astype(np.float32)
+    values[~np.isfinite(values)] = np.nan
+    # NaN sorts last, so the finite values of a row are its first count
+    ordered = np.sort(values, axis=1)
+    last = np.count_nonzero(~np.isnan(ordered), axis=1)[:, None] - 1
+    position = percentiles / 100 * np.maximum(last, 0)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, np.maximum(last, 0))
+    frac = position - lower
+    bands = (np.take_along_axis(ordered, lower, axis=1) * (1 - frac) +
+             np.take_along_axis(ordered, upper, axis=1) * frac)
+    return np.where(last >= 0, bands, np.nan)
+
+
+def calculate_tolerance(params, spineModel=None):
+    """Percentile bands of a setup's curves under component tolerances
+
+    'tolerances' gives a distribution per setup parameter (see
+    sample_tolerances), e.g. arrowGPI, pointWeightOffset, fletchWeight or ibo.
+    'samples' (default 100,000) draws go through evaluate_setup as one
+    poundage x samples broadcast, in blocks of poundage rows to bound memory
+    and with samples contiguous along rows for the percentiles. Returns the
+    'percentiles' of every TOLERANCE_SERIES curve over the poundage grid
+    ('bands', poundage x percentile) and at the selected poundage
+    ('selected'). Samples without a finite value (e.g. an ibo draw too low
+    to launch the arrow) are left out of the percentiles and counted in
+    'invalidSamples' and 'selectedInvalidSamples'.
+    """
+    samples = int(params.get('samples', 100_000))
+    if not 1 <= samples <= MAX_TOLERANCE_SAMPLES:
+        raise ValueError(f'samples must be between 1 and {MAX_TOLERANCE_SAMPLES}')
+    percentiles = np.asarray(params.get('percentiles', TOLERANCE_PERCENTILES), dtype=float)
+    if np.any((percentiles < 0) | (percentiles > 100)):
+        raise ValueError('percentiles must be between 0 and 100')
+
+    calcPoundage = parse_poundage_grid(params)
+    if samples * (calcPoundage.size + 1) > MAX_TOLERANCE_POINTS:
+        raise ValueError(f'a tolerance analysis is limited to {MAX_TOLERANCE_POINTS} sample x poundage points')
+    spineModel = spineModel or get_dataset().spineModel
+    p = parse_setup_params(params, spineModel)
+    rng = np.random.default_rng(params.get('seed'))
+    p = sample_tolerances(p, params.get('tolerances') or {}, samples, rng)
+
+    poundage = np.append(calcPoundage, p['chosenPoundage'] if np.ndim(p['chosenPoundage']) == 0 else np.nan)
+    bands = {name: np.empty((poundage.size, percentiles.size)) for name in TOLERANCE_SERIES}
+    invalid = {name: np.empty(poundage.size, dtype=np.int64) for name in TOLERANCE_SERIES}
+    block = max(1, TOLERANCE_BLOCK_POINTS // samples)
+    for start in range(0, poundage.size, block):
+        rows = poundage[start:start + block, None]
+        # A toleranced selected poundage is drawn per sample rather than fixed
+        rows = np.where(np.isnan(rows), p['chosenPoundage'], rows)
+        series, _ = evaluate_setup(p, np.broadcast_to(rows, (rows.shape[0], samples)), spineModel=spineModel)
+        for name in TOLERANCE_SERIES:
+            bands[name][start:start + block] = row_percentiles(series[name], percentiles)
+            invalid[name][start:start + block] = np.count_nonzero(~np.isfinite(series[name]), axis=1)
+
+    return {
+        'calcPoundage': calcPoundage,
+        'percentiles': percentiles,
+        'samples': samples,
+        'bands': {name: values[:-1] for name, values in bands.items()},
+        'selected': {name: values[-1] for name, values in bands.items()},
+        'invalidSamples': {name: counts[:-1] for name, counts in invalid.items()},
+        'selectedInvalidSamples': {name: int(counts[-1]) for name, counts in invalid.items()}
+    }
@@ -0,0 +1,228 @@
+import csv
+import os
+
+import numpy as np
+
+# Get the directory where this script is located
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CATALOG_PATH = os.path.join(BASE_DIR, "ArrowGPIs.csv")
+
+CATALOG_COLUMNS = ('Arrow Name', 'Shaft', 'Brand', 'Spine', 'OD', 'GPI')
+
+
+class StringColumn:
+    """Dictionary-encoded column of strings
+
+    values holds the distinct strings, sorted, and codes the position in
+    values of every entry. Both are plain typed arrays, so a column can be
+    saved and memory-mapped like the numeric ones.
+    """
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def from_strings(cls, strings):
+        values, codes = np.unique(np.array(strings, dtype=str), return_inverse=True)
+        return cls(codes.astype(np.int32), values)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, key):
+        """The string at a position, or an array of the strings at several"""
+        codes = self.codes[key]
+        if np.ndim(codes) == 0:
+            return str(self.values[codes])
+        return self.values[codes]
+
+    def isin(self, strings, positions=None):
+        """Whether each entry (or each entry at positions) is one of strings"""
+        codes = self.codes if positions is None else self.codes[positions]
+        return np.isin(self.values, list(strings))[codes]
+
+
+def load_catalog(path=CATALOG_PATH):
+    """Read the shaft catalog into column arrays
+
+    Returns a dict with 'name', 'shaft' and 'brand' (StringColumns) and
+    'spine', 'od' [in] and 'gpi' [gr/in] (float arrays), one entry per shaft.
+    Raises ValueError if a column is missing, a number doesn't parse, or the
+    catalog holds no shafts.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in CATALOG_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f'shaft catalog {path} lacks the columns {", ".join(missing)}')
+        rows = [row for row in reader if row.get('Shaft')]
+    if not rows:
+        raise ValueError(f'shaft catalog {path} holds no shafts')
+    catalog = {
+        'name': StringColumn.from_strings([row['Arrow Name'] for row in rows]),
+        'shaft': StringColumn.from_strings([row['Shaft'] for row in rows]),
+        'brand': StringColumn.from_strings([row['Brand'] for row in rows]),
+        'spine': np.array([row['Spine'] for row in rows], dtype=float),
+        'od': np.array([row['OD'] for row in rows], dtype=float),
+        'gpi': np.array([row['GPI'] for row in rows], dtype=float)
+    }
+    for column in ('spine', 'od', 'gpi'):
+        if not np.all(np.isfinite(catalog[column]) & (catalog[column] > 0)):
+            raise ValueError(f'shaft catalog {path} has a {column} that is not a positive number')
+    return catalog
+
+
+# Catalog columns that can be searched by range
+INDEXED_COLUMNS = ('spine', 'od', 'gpi')
+
+
+class CatalogIndex:
+    """Search index over a shaft catalog
+
+    Each of INDEXED_COLUMNS is kept sorted with the catalog positions in that
+    order, so a range is two binary searches. Text is indexed by the
+    lower-cased words of every shaft's name, brand and shaft model, sorted,
+    so the shafts whose words start with a prefix are also a contiguous
+    slice found by binary search. arrays() and from_arrays() save and
+    restore the index without rebuilding it.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.size = len(catalog['name'])
+        self.order = {}
+        self.sorted = {}
+        for column in INDEXED_COLUMNS:
+            self.order[column] = np.argsort(catalog[column], kind='stable')
+            self.sorted[column] = catalog[column][self.order[column]]
+
+        words = [(word, i) for i in range(self.size)
+                 for text in (catalog['name'][i], catalog['brand'][i], catalog['shaft'][i])
+                 for word in set(str(text).lower().split())]
+        words.sort()
+        self.words = np.array([word for word, _ in words], dtype=str)
+        self.word_positions = np.array([i for _, i in words], dtype=np.intp)
+
+    def arrays(self):
+        """Every array of the index and its catalog, by name"""
+        arrays = {'words': self.words, 'word_positions': self.word_positions}
+        for column, values in self.catalog.items():
+            if isinstance(values, StringColumn):
+                arrays[f'{column}.codes'] = values.codes
+                arrays[f'{column}.values'] = values.values
+            else:
+                arrays[column] = values
+        for column in INDEXED_COLUMNS:
+            arrays[f'{column}.order'] = self.order[column]
+            arrays[f'{column}.sorted'] = self.sorted[column]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Index from the arrays() of another, used as they are (e.g. memory-mapped)"""
+        index = cls.__new__(cls)
+        index.catalog = {column: arrays[column] for column in ('spine', 'od', 'gpi')}
+        for column in ('name', 'shaft', 'brand'):
+            index.catalog[column] = StringColumn(arrays[f'{column}.codes'], arrays[f'{column}.values'])
+        index.size = len(index.catalog['name'])
+        index.order = {column: arrays[f'{column}.order'] for column in INDEXED_COLUMNS}
+        index.sorted = {column: arrays[f'{column}.sorted'] for column in INDEXED_COLUMNS}
+        index.words = arrays['words']
+        index.word_positions = arrays['word_positions']
+        return index
+
+    def _bounds(self, column, low, high):
+        values = self.sorted[column]
+        start = 0 if low is None else int(np.searchsorted(values, low, side='left'))
+        stop = values.size if high is None else int(np.searchsorted(values, high, side='right'))
+        return start, max(start, stop)
+
+    def range(self, column, low=None, high=None):
+        """Catalog positions with low <= column <= high, a slice of the column's sort order"""
+        start, stop = self._bounds(column, low, high)
+        return self.order[column][start:stop]
+
+    def _word_bounds(self, prefix):
+        start = int(np.searchsorted(self.words, prefix, side='left'))
+        stop = int(np.searchsorted(self.words, prefix + '\U0010ffff', side='left'))
+        return start, stop
+
+    def _mask(self, positions):
+        """Catalog-sized boolean mask of positions, which may repeat and be in any order"""
+        mask = np.zeros(self.size, dtype=bool)
+        mask[positions] = True
+        return mask
+
+    def prefix(self, prefix):
+        """Catalog positions of the shafts having a word that starts with prefix"""
+        start, stop = self._word_bounds(prefix.lower())
+        return np.flatnonzero(self._mask(self.word_positions[start:stop]))
+
+    def search(self, query=None, ranges=None, brands=None):
+        """Catalog positions of the shafts matching every criterion, in catalog order
+
+        query matches shafts that have, for each of its words, a word starting
+        with it. ranges maps INDEXED_COLUMNS to (low, high) bounds, either
+        of which may be None, and brands restricts the brand. The most
+        selective word or range, judged by the size of its index slice, is
+        the only one whose positions are collected; the other criteria are
+        checked on its candidates only. Positions are put in catalog order
+        (and a shaft matching a prefix with several words counted once)
+        through a catalog-sized mask rather than a sort.
+        """
+        ranges = {column: bounds for column, bounds in (ranges or {}).items()
+                  if bounds[0] is not None or bounds[1] is not None}
+        for column in ranges:
+            if column not in INDEXED_COLUMNS:
+                raise ValueError(f'{column!r} cannot be searched by range, use one of {", ".join(INDEXED_COLUMNS)}')
+        words = [self._word_bounds(word) for word in (query or '').lower().split()]
+
+        # Size of every indexed criterion, from the binary searches alone
+        sizes = [(stop - start, 'word', i) for i, (start, stop) in enumerate(words)]
+        for column, (low, high) in ranges.items():
+            start, stop = self._bounds(column, low, high)
+            sizes.append((stop - start, 'range', column))
+        if not sizes:
+            positions = np.arange(self.size)
+        else:
+            _, kind, key = min(sizes)
+            if kind == 'word':
+                start, stop = words.pop(key)
+                positions = np.flatnonzero(self._mask(self.word_positions[start:stop]))
+            else:
+                positions = np.flatnonzero(self._mask(self.range(key, *ranges.pop(key))))
+
+        for column, (low, high) in ranges.items():
+            values = self.catalog[column][positions]
+            keep = np.ones(positions.size, dtype=bool)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+            positions = positions[keep]
+        for start, stop in words:
+            if positions.size:
+                positions = positions[self._mask(self.word_positions[start:stop])[positions]]
+        if brands:
+            positions = positions[self.catalog['brand'].isin(brands, positions)]
+        return positions
+
+
+def search_catalog(index, query=None, ranges=None, brands=None, limit=20):
+    """Shafts of a CatalogIndex matching a search (see CatalogIndex.search), at most limit of them in catalog order"""
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    catalog = index.catalog
+    positions = index.search(query, ranges, brands)
+    return {
+        'matched': int(positions.size),
+        'shafts': [{
+            'name': catalog['name'][i],
+            'brand': catalog['brand'][i],
+            'shaft': catalog['shaft'][i],
+            'spine': float(catalog['spine'][i]),
+            'od': float(catalog['od'][i]),
+            'gpi': float(catalog['gpi'][i])
+        } for i in positions[:limit]]
+    }
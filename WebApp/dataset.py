@@ -0,0 +1,161 @@
+import hashlib
+import os
+import threading
+import time
+
+from catalog import CATALOG_PATH, CatalogIndex, load_catalog
+from regression import SPINE_CHART_PATH, MODEL_CACHE_PATH, chart_key, load_model
+from snapshot import SNAPSHOT_DIR, load_snapshot, write_snapshot
+
+# Seconds between checks of the data files for changes, per gunicorn worker;
+# 0 disables the check so data only changes through an explicit reload
+DATA_CHECK_INTERVAL = float(os.environ.get('DATA_CHECK_INTERVAL', 5))
+
+
+def file_key(path):
+    """Identity of a file's content"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def file_stamps(paths=(CATALOG_PATH, SPINE_CHART_PATH)):
+    """Modification time and size of each data file, a cheap change check"""
+    stamps = []
+    for path in paths:
+        try:
+            info = os.stat(path)
+            stamps.append((info.st_mtime_ns, info.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+class Dataset:
+    """One consistent version of the shaft catalog and the point weight models
+
+    Its catalog and models are never modified: a reload builds a new Dataset and swaps it
+    in, so a request that took the current one keeps a consistent view
+    until it finishes. version identifies the content, so it is the same in
+    every gunicorn worker and can key caches and ETags.
+    """
+
+    def __init__(self, catalogIndex, spineModel, catalogKey, stamps):
+        self.catalogIndex = catalogIndex
+        self.catalog = catalogIndex.catalog
+        self.spineModel = spineModel
+        self.catalogKey = catalogKey
+        self.stamps = stamps
+        self.version = hashlib.sha256(f'{catalogKey}:{spineModel.key}'.encode()).hexdigest()[:16]
+        self.loadedAt = time.time()
+
+    def summary(self):
+        return {
+            'version': self.version,
+            'shafts': self.catalogIndex.size,
+            'models': list(self.spineModel.names),
+            'loadedAt': self.loadedAt
+        }
+
+
+_current = None
+_load_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_last_check = 0.0
+_failed_stamps = None
+
+
+def _build(previous=None):
+    """Dataset of the data files: from previous where unchanged, else the snapshot, else the CSVs
+
+    A dataset built from the CSVs is compiled into a new snapshot, so the
+    other workers (and the next start) map it instead of building it again.
+    """
+    stamps = file_stamps()
+    catalogKey = file_key(CATALOG_PATH)
+    chartKey = chart_key(SPINE_CHART_PATH)
+    if previous is not None and previous.catalogKey == catalogKey and previous.spineModel.key == chartKey:
+        return Dataset(previous.catalogIndex, previous.spineModel, catalogKey, stamps)
+    snapshot = load_snapshot(catalogKey, chartKey, SNAPSHOT_DIR)
+    if snapshot is not None:
+        return Dataset(*snapshot, catalogKey, stamps)
+
+    if previous is not None and previous.catalogKey == catalogKey:
+        catalogIndex = previous.catalogIndex
+    else:
+        catalogIndex = CatalogIndex(load_catalog(CATALOG_PATH))
+    spineModel = load_model(SPINE_CHART_PATH, MODEL_CACHE_PATH,
+                            previous=previous.spineModel if previous is not None else None)
+    try:
+        write_snapshot(catalogIndex, spineModel, catalogKey, SNAPSHOT_DIR)
+    except OSError:
+        pass
+    return Dataset(catalogIndex, spineModel, catalogKey, stamps)
+
+
+def get_dataset():
+    """Current dataset, loaded on first use"""
+    global _current
+    dataset = _current
+    if dataset is None:
+        with _load_lock:
+            if _current is None:
+                _current = _build()
+            dataset = _current
+    return dataset
+
+
+def reload_dataset(force=False):
+    """Reload the data files if they changed (or always, with force)
+
+    The catalog is re-read only if its content changed, and the models are
+    refit only for the spine chart groups that changed. The new dataset is
+    validated in full before it replaces the current one; if it is invalid,
+    ValueError (or OSError) is raised and the current dataset stays. Returns
+    a summary with 'changed' telling whether the version moved.
+    """
+    global _current, _failed_stamps
+    with _reload_lock:
+        current = get_dataset()
+        stamps = file_stamps()
+        if not force and stamps == current.stamps:
+            return dict(current.summary(), changed=False, refitGroups=0)
+        try:
+            dataset = _build(current)
+        except (OSError, ValueError):
+            _failed_stamps = stamps
+            raise
+        _failed_stamps = None
+        refitGroups = dataset.spineModel.refitGroups if dataset.spineModel is not current.spineModel else 0
+        changed = dataset.version != current.version
+        if changed:
+            _current = dataset
+        else:
+            # Same content (a touched file), just remember the new stamps
+            current.stamps = dataset.stamps
+        return dict(_current.summary(), changed=changed, refitGroups=refitGroups)
+
+
+def check_for_updates(interval=DATA_CHECK_INTERVAL):
+    """Reload the data files if they changed, at most every interval seconds
+
+    Cheap enough to call on every request. Returns True if the dataset
+    changed. Raises like reload_dataset if the changed files are invalid; a
+    version that failed is not retried until the files change again.
+    """
+    global _last_check
+    if interval <= 0:
+        return False
+    now = time.monotonic()
+    if now - _last_check < interval:
+        return False
+    _last_check = now
+    stamps = file_stamps()
+    if stamps == get_dataset().stamps or stamps == _failed_stamps:
+        return False
+    return reload_dataset()['changed']
+
+
+if __name__ == '__main__':
+    # Build step: fit the models and compile the snapshot the workers map
+    print(get_dataset().summary())
+    print(f'Snapshot in {SNAPSHOT_DIR}')
@@ -0,0 +1,137 @@
+import gzip
+import json
+import math
+import struct
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Binary responses: a little-endian uint32 header length, a UTF-8 JSON header, then
+# the raw array buffers, each starting at a multiple of BUFFER_ALIGNMENT bytes so
+# the browser can view them in place as Float32Array/Float64Array
+BINARY_MIMETYPE = 'application/vnd.arrowcalc.binary'
+BUFFER_ALIGNMENT = 8
+
+# Responses below this size [bytes] are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = ('application/json', BINARY_MIMETYPE, 'text/html', 'text/plain', 'text/css',
+                          'application/javascript')
+
+
+def to_builtin(value, digits=None):
+    """Replace every NumPy array in a (nested) payload by a list, for JSON
+
+    With digits, floating values are rounded to that many significant digits,
+    which shortens their JSON text. NaN and infinities, in arrays or as plain
+    floats, become None (null), which JSON can represent.
+    """
+    if isinstance(value, dict):
+        return {key: to_builtin(item, digits) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_builtin(item, digits) for item in value]
+    if isinstance(value, (np.ndarray, np.generic)):
+        if np.issubdtype(value.dtype, np.floating) and not np.isfinite(value).all():
+            value = np.where(np.isfinite(value), value, None)
+            digits = None
+        if digits is not None and np.issubdtype(value.dtype, np.floating):
+            return _round_significant(value.tolist(), digits)
+        return value.tolist()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _round_significant(values, digits):
+    if isinstance(values, list):
+        return [_round_significant(item, digits) for item in values]
+    return float(f'{values:.{digits}g}')
+
+
+def encode_binary(payload, dtype=np.float64):
+    """Encode a payload with every floating NumPy array as a raw little-endian buffer
+
+    Arrays are replaced in the JSON header by {"$array": index, "dtype",
+    "shape"}, and the header's "buffers" lists each buffer's [offset, byteLength]
+    from the start of the message. Other arrays and values stay in the header.
+    """
+    dtype = np.dtype(dtype).newbyteorder('<')
+    buffers = []
+
+    def extract(value):
+        if isinstance(value, dict):
+            return {key: extract(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [extract(item) for item in value]
+        if isinstance(value, np.ndarray) and np.issubdtype(value.dtype, np.floating):
+            buffers.append(np.ascontiguousarray(value, dtype=dtype).tobytes())
+            return {'$array': len(buffers) - 1, 'dtype': dtype.name, 'shape': list(value.shape)}
+        if isinstance(value, (np.ndarray, np.generic)):
+            return value.tolist()
+        return value
+
+    data = extract(payload)
+
+    # Offsets depend on the header length, which depends on the offsets' digits;
+    # lay out with a placeholder header until the length stops changing
+    header_length = 0
+    while True:
+        offset = _align(4 + header_length)
+        layout = []
+        for buffer in buffers:
+            layout.append([offset, len(buffer)])
+            offset = _align(offset + len(buffer))
+        header = json.dumps({'data': data, 'buffers': layout}, separators=(',', ':')).encode('utf-8')
+        if len(header) == header_length:
+            break
+        header_length = len(header)
+
+    parts = [struct.pack('<I', len(header)), header]
+    position = 4 + len(header)
+    for (offset, _), buffer in zip(layout, buffers):
+        parts.append(b'\0' * (offset - position))
+        parts.append(buffer)
+        position = offset + len(buffer)
+    return b''.join(parts)
+
+
+def _align(offset):
+    return -(-offset // BUFFER_ALIGNMENT) * BUFFER_ALIGNMENT
+
+
+def decode_binary(message):
+    """Inverse of encode_binary, returning the payload with NumPy arrays"""
+    (header_length,) = struct.unpack_from('<I', message)
+    header = json.loads(message[4:4 + header_length].decode('utf-8'))
+
+    def restore(value):
+        if isinstance(value, dict):
+            if '$array' in value:
+                offset, length = header['buffers'][value['$array']]
+                dtype = np.dtype(value['dtype']).newbyteorder('<')
+                return np.frombuffer(message, dtype, length // dtype.itemsize, offset).reshape(value['shape'])
+            return {key: restore(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [restore(item) for item in value]
+        return value
+
+    return restore(header['data'])
+
+
+def choose_content_encoding(accept_encoding):
+    """Best supported compression for an Accept-Encoding header: 'br', 'gzip' or None"""
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, content_encoding):
+    """Compress a response body with 'br' or 'gzip'"""
+    if content_encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=5)
@@ -0,0 +1,341 @@
+import hashlib
+import importlib.metadata
+import json
+import os
+
+import numpy as np
+
+from calculator import CHECKPOINT_DISTANCES_YD
+
+# Prebuilt templates, so workers start without importing plotly (python figures.py rebuilds it)
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'figure_templates.json')
+
+# Define colors
+SETUP_COLORS = ('#1976D2', '#FF9800')
+SETUP_BAND_COLORS = ('rgba(25, 118, 210, 0.15)', 'rgba(255, 152, 0, 0.15)')
+
+# Line dash per downrange checkpoint (the muzzle line is solid)
+CHECKPOINT_DASHES = ('dash', 'dashdot', 'dot')
+
+# Create all plots with larger fonts and clearer styling
+AXIS_STYLE = dict(
+    title_font=dict(size=14),
+    tickfont=dict(size=11),
+    showgrid=True,
+    gridcolor='lightgray',
+    showline=True,
+    linewidth=1,
+    linecolor='black',
+    zeroline=True,
+    zerolinewidth=1,
+    zerolinecolor='black'
+)
+
+DEFAULT_LAYOUT = dict(
+    font=dict(size=12),
+    xaxis=AXIS_STYLE,
+    yaxis=AXIS_STYLE,
+    title_font=dict(size=16),
+    showlegend=False,  # Default to no legend
+    plot_bgcolor='white',
+    paper_bgcolor='white',
+    hovermode=False,  # Disable hover tooltips
+    margin=dict(l=60, r=20, t=50, b=50)  # Reduced right margin for larger plots
+)
+
+# Layout for plots with distance legends
+DISTANCE_LEGEND_LAYOUT = dict(
+    DEFAULT_LAYOUT,
+    showlegend=True,
+    legend=dict(
+        font=dict(size=12),
+        orientation="h",
+        yanchor="top",
+        y=-0.15,
+        xanchor="center",
+        x=0.5
+    ),
+    margin=dict(l=60, r=20, t=50, b=80)  # Reduced right margin, extra bottom for legend
+)
+
+# Background bands (y0, y1, color) of the FOC [%] and KE [J] plots
+FOC_BANDS = ((0, 12, 'red'), (12, 19, '#90CAF9'), (19, 30, '#42A5F5'), (30, 35, '#1E88E5'))
+KE_BANDS = ((0, 35, 'red'), (35, 55, '#90CAF9'), (55, 88, '#42A5F5'), (88, 150, '#1E88E5'))
+
+
+class FigureTemplate:
+    """A comparison figure whose layout and trace styling are serialized once
+
+    Traces are added with a binding that says where their numbers come from
+    per request: a series of one setup ({'setup', 'series'}), the selected
+    point of one setup ({'setup', 'point', 'decimals', 'suffix'}, labelled
+    with the value) or nothing (static legend stubs). render() then only
+    serializes the bound numbers and splices them into the prebuilt JSON;
+    spec() hands the same static parts and bindings to the browser so it can
+    do the splicing itself. Templates are built through plotly, or restored
+    from a snapshot of their spec() with from_spec().
+    """
+
+    def __init__(self, layout, bands=()):
+        import plotly.graph_objects as go
+        self.figure = go.Figure()
+        # Bands span the full plot width whatever the poundage grid
+        for y0, y1, color in bands:
+            self.figure.add_shape(type="rect", xref="paper", x0=0, x1=1, y0=y0, y1=y1,
+                                  fillcolor=color, opacity=0.3, layer="below", line_width=0)
+        self.figure.update_layout(**layout)
+        self.bindings = []
+
+    def add_series(self, setup, key, **trace):
+        import plotly.graph_objects as go
+        self.figure.add_trace(go.Scatter(x=[], y=[], mode='lines', **trace))
+        self.bindings.append({'setup': setup, 'series': key})
+
+    def add_marker(self, setup, key, label, **trace):
+        import plotly.graph_objects as go
+        self.figure.add_trace(go.Scatter(x=[], y=[], text=[], mode='markers+text', showlegend=False, **trace))
+        decimals, suffix = label
+        self.bindings.append({'setup': setup, 'point': key, 'decimals': decimals, 'suffix': suffix})
+
+    def add_legend_stub(self, name, line):
+        import plotly.graph_objects as go
+        self.figure.add_trace(go.Scatter(x=[None], y=[None], mode='lines', name=name, line=line,
+                                         showlegend=True))
+        self.bindings.append(None)
+
+    def build(self):
+        """Serialize the static parts; call once every trace has been added"""
+        spec = json.loads(self.figure.to_json())
+        for trace, binding in zip(spec['data'], self.bindings):
+            if binding is not None:
+                for name in ('x', 'y', 'text'):
+                    trace.pop(name, None)
+        del self.figure
+        return self._serialize(spec['layout'], spec['data'])
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Template restored from a spec() without plotly"""
+        template = cls.__new__(cls)
+        template.bindings = spec['bindings']
+        return template._serialize(spec['layout'], spec['traces'])
+
+    def _serialize(self, layout, traces):
+        self.layout = layout
+        self.traces = traces
+        self.layout_json = json.dumps(self.layout, separators=(',', ':'))
+        self.trace_json = [json.dumps(trace, separators=(',', ':'))[1:-1] for trace in self.traces]
+        return self
+
+    def render(self, data, selected):
+        """Figure JSON for the given per-setup series and selected points"""
+        traces = []
+        for trace_json, binding in zip(self.trace_json, self.bindings):
+            if binding is None:
+                traces.append('{' + trace_json + '}')
+                continue
+            setup = binding['setup']
+            if 'series' in binding:
+                x, y = data[setup]['calcPoundage'], data[setup][binding['series']]
+                values = f'"x":{_json_array(x)},"y":{_json_array(y)}'
+            else:
+                point = selected[setup]
+                value = point[binding['point']]
+                text = f"{value:.{binding['decimals']}f}{binding['suffix']}"
+                values = (f'"x":[{_json_number(point["calcPoundage"])}],"y":[{_json_number(value)}],'
+                          f'"text":{json.dumps([text])}')
+            traces.append('{' + values + ',' + trace_json + '}')
+        return '{"data":[' + ','.join(traces) + '],"layout":' + self.layout_json + '}'
+
+    def spec(self):
+        """Static layout, traces without their data, and the binding of every trace"""
+        return {'layout': self.layout, 'traces': self.traces, 'bindings': self.bindings}
+
+
+def _json_array(values):
+    """JSON array text of numeric values, with non-finite values as null like fig.to_json()"""
+    values = np.asarray(values, dtype=float)
+    if not np.isfinite(values).all():
+        return json.dumps(np.where(np.isfinite(values), values, None).tolist(), separators=(',', ':'))
+    return json.dumps(values.tolist(), separators=(',', ':'))
+
+
+def _json_number(value):
+    return json.dumps(float(value)) if np.isfinite(value) else 'null'
+
+
+def _current_markers(figure, key, label):
+    """Large labelled marker at each setup's selected point"""
+    for setup, color in enumerate(SETUP_COLORS):
+        figure.add_marker(setup, key, label, name=f'Current {setup + 1}',
+                          marker=dict(color=color, size=15),
+                          textposition="top right",
+                          textfont=dict(size=12, color=color))
+
+
+def _simple_figure(key, label, title, yaxis_title, bands=(), **layout):
+    """One line per setup plus the selected points"""
+    figure = FigureTemplate(dict(title=title, xaxis_title="Poundage", yaxis_title=yaxis_title,
+                                 **layout, **DEFAULT_LAYOUT), bands)
+    for setup, color in enumerate(SETUP_COLORS):
+        figure.add_series(setup, key, name=f'Setup {setup + 1}', line=dict(color=color, width=3))
+    _current_markers(figure, key, label)
+    return figure.build()
+
+
+def _point_weight_figure():
+    """Optimal point weight per setup over the band between its lower and upper bound fits"""
+    figure = FigureTemplate(dict(title="Poundage vs Optimal Point Weight [grains]", xaxis_title="Poundage",
+                                 yaxis_title="Point Weight [gr]", **DEFAULT_LAYOUT))
+    for setup, color in enumerate(SETUP_BAND_COLORS):
+        figure.add_series(setup, 'calcOpPointWeightMin', name=f'Setup {setup + 1} min', line=dict(width=0),
+                          showlegend=False, hoverinfo='skip')
+        figure.add_series(setup, 'calcOpPointWeightMax', name=f'Setup {setup + 1} min-max', line=dict(width=0),
+                          fill='tonexty', fillcolor=color, showlegend=False, hoverinfo='skip')
+    for setup, color in enumerate(SETUP_COLORS):
+        figure.add_series(setup, 'calcOpPointWeight', name=f'Setup {setup + 1}', line=dict(color=color, width=3))
+    _current_markers(figure, 'calcOpPointWeight', (0, 'gr'))
+    return figure.build()
+
+
+def _distance_figure(key, label, far_label, title, yaxis_title, bands=(), **layout):
+    """Muzzle and downrange lines per setup, with the selected points at the muzzle and furthest checkpoint"""
+    figure = FigureTemplate(dict(title=title, xaxis_title="Poundage", yaxis_title=yaxis_title,
+                                 **layout, **DISTANCE_LEGEND_LAYOUT), bands)
+
+    # Add dummy traces for legend
+    figure.add_legend_stub('0yd', dict(color='gray', width=3))
+    for yards, dash in zip(CHECKPOINT_DISTANCES_YD, CHECKPOINT_DASHES):
+        figure.add_legend_stub(f'{yards}yd', dict(color='gray', width=2, dash=dash))
+
+    for setup, color in enumerate(SETUP_COLORS):
+        figure.add_series(setup, key, name=f'Setup {setup + 1} (0yd)', line=dict(color=color, width=3),
+                          showlegend=False)
+        for yards, dash in zip(CHECKPOINT_DISTANCES_YD, CHECKPOINT_DASHES):
+            figure.add_series(setup, f'{key}{yards}yd', name=f'Setup {setup + 1} ({yards}yd)',
+                              line=dict(color=color, width=2, dash=dash), opacity=0.7, showlegend=False)
+
+    # Add current points
+    _current_markers(figure, key, label)
+
+    # Add points at the furthest checkpoint with labels
+    far = f'{key}{CHECKPOINT_DISTANCES_YD[-1]}yd'
+    for setup, color in enumerate(SETUP_COLORS):
+        figure.add_marker(setup, far, far_label,
+                          marker=dict(color=color, size=10),
+                          textposition="bottom center",
+                          textfont=dict(size=11, color=color),
+                          opacity=0.7)
+    return figure.build()
+
+
+def _tof_figure():
+    """Time of flight to each checkpoint per setup, with the selected point at the furthest one"""
+    figure = FigureTemplate(dict(title="Poundage vs Time of Flight [s]", xaxis_title="Poundage",
+                                 yaxis_title="Time [s]", **DISTANCE_LEGEND_LAYOUT))
+
+    # The nearest checkpoint is drawn solid, the further ones dashed and fainter
+    styles = [(dict(width=3), None)] + [(dict(width=2, dash=dash), opacity)
+                                        for dash, opacity in zip(('dash', 'dot'), (0.8, 0.7))]
+    styles = styles[:len(CHECKPOINT_DISTANCES_YD)]
+
+    for yards, (line, _) in zip(CHECKPOINT_DISTANCES_YD, styles):
+        figure.add_legend_stub(f'{yards}yd', dict(color='gray', **line))
+
+    for setup, color in enumerate(SETUP_COLORS):
+        for yards, (line, opacity) in zip(CHECKPOINT_DISTANCES_YD, styles):
+            figure.add_series(setup, f'calcTOF{yards}yd', name=f'Setup {setup + 1} ({yards}yd)',
+                              line=dict(color=color, **line), opacity=opacity, showlegend=False)
+
+    # Add points at the furthest checkpoint
+    _current_markers(figure, f'calcTOF{CHECKPOINT_DISTANCES_YD[-1]}yd', (3, 's'))
+    return figure.build()
+
+
+def build_comparison_figures():
+    """Every comparison figure, built through plotly"""
+    return {
+        'pointWeight': _point_weight_figure(),
+        'totalMass': _simple_figure('calcTotalArrowMass', (0, 'gr'), "Poundage vs Total Arrow Mass [grains]",
+                                    "Total Mass [gr]"),
+        'foc': _simple_figure('calcFOC', (1, '%'), "Poundage vs FOC [%]", "FOC [%]", FOC_BANDS,
+                              yaxis_range=[0, 35]),
+        'fps': _distance_figure('calcFPS', (0, 'fps'), (0, ''), "Poundage vs FPS", "FPS"),
+        'ke': _distance_figure('calcKE', (0, 'J'), (0, ''), "Poundage vs Kinetic Energy [J]", "KE [J]", KE_BANDS,
+                               yaxis_range=[0, 150]),
+        'momentum': _distance_figure('calcMomentum', (2, ''), (2, ''), "Poundage vs Momentum [kg·m/s]", "Momentum"),
+        'tof': _tof_figure()
+    }
+
+
+def _snapshot_key():
+    """What a snapshot was built from: this module's source, the checkpoints and the plotly version"""
+    with open(__file__, 'rb') as f:
+        source = hashlib.sha256(f.read()).hexdigest()
+    try:
+        plotly_version = importlib.metadata.version('plotly')
+    except importlib.metadata.PackageNotFoundError:
+        plotly_version = None
+    return f'{source}:{CHECKPOINT_DISTANCES_YD}:{plotly_version}'
+
+
+def load_comparison_figures(rebuild=False):
+    """Comparison figures from the snapshot if it is current, else built and snapshotted"""
+    key = _snapshot_key()
+    if not rebuild:
+        try:
+            with open(SNAPSHOT_PATH, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if snapshot['key'] == key:
+                return {name: FigureTemplate.from_spec(spec) for name, spec in snapshot['figures'].items()}
+        except (OSError, ValueError, KeyError):
+            pass
+
+    figures = build_comparison_figures()
+    try:
+        temporary = f'{SNAPSHOT_PATH}.{os.getpid()}'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'figures': {name: figure.spec() for name, figure in figures.items()}}, f)
+        os.replace(temporary, SNAPSHOT_PATH)
+    except OSError:
+        pass
+    return figures
+
+
+# Every comparison figure, loaded once at import
+COMPARISON_FIGURES = load_comparison_figures()
+
+
+def create_comparison_plots(data1, data2, selected1, selected2):
+    """Create comparison plots showing both setups using Plotly"""
+    data = (data1, data2)
+    selected = (selected1, selected2)
+    return {name: figure.render(data, selected) for name, figure in COMPARISON_FIGURES.items()}
+
+
+# Static parts of every figure for clients that render from data-only responses
+FIGURE_TEMPLATES_JSON = json.dumps({name: figure.spec() for name, figure in COMPARISON_FIGURES.items()},
+                                   separators=(',', ':'))
+
+# Every series and selected point the figures read
+COMPARISON_KEYS = sorted({binding.get('series') or binding['point']
+                          for figure in COMPARISON_FIGURES.values()
+                          for binding in figure.bindings if binding is not None} | {'calcPoundage'})
+
+
+# Significant digits worth sending for plotted series, far below what a plot can
+# resolve; rounding roughly thirds their JSON size
+COMPACT_DIGITS = 6
+
+
+def compact_setup(data, selected):
+    """Data-only part of a comparison response: the series and selected points the figures need"""
+    return {
+        'series': {key: np.asarray(data[key]) for key in COMPARISON_KEYS},
+        'selected': {key: selected[key] for key in COMPARISON_KEYS}
+    }
+
+
+if __name__ == '__main__':
+    load_comparison_figures(rebuild=True)
+    print(f'Wrote {SNAPSHOT_PATH}')
@@ -0,0 +1,22 @@
+"""Gunicorn settings for the production image: gunicorn -c gunicorn.conf.py app_plotly:app"""
+import os
+
+from admission import WORKER_THREADS, check_capacity
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = WORKER_THREADS
+timeout = 120
+
+# Fail at startup if admission control could fill every request thread
+check_capacity(threads)
+
+# Import app_plotly, and so run create_app() with its warm-up, once in the
+# master; the workers fork from it and share its state copy-on-write
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Start this worker's compute pool before it takes requests"""
+    from admission import warm_pool
+    warm_pool()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+"""Stream manufacturer spine charts into one columnar spine store
+
+Run from the WebApp directory:
+
+    python ingest.py ../ArrowSpine3.csv ../ArrowSpine2.csv ../ArrowSpine.csv
+
+Each chart is read in chunks of CHUNK_ROWS rows, its columns are mapped to
+the canonical schema, and its valid, new rows are appended to the store.
+Point the app at the store with SPINE_CHART_PATH=spine_store.
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+
+# Get the directory where this script is located
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SPINE_STORE_DIR = os.path.join(BASE_DIR, 'spine_store')
+
+# Bumped when the store's layout changes
+STORE_FORMAT = 1
+
+# Rows parsed, validated and appended at a time
+CHUNK_ROWS = int(os.environ.get('INGEST_CHUNK_ROWS', 50_000))
+
+# Canonical spine chart schema (the columns of ArrowSpine3.csv) and the
+# store's dtype of each column; Shaft is stored as codes into a name table
+CANONICAL_COLUMNS = {
+    'Shaft': np.int32,
+    'TotalPointWeight': np.float64,
+    'ArrowLength': np.float64,
+    'Spine': np.float64,
+    'LowerBoundPoundage': np.float64,
+    'UpperBoundPoundage': np.float64,
+    'NominalPoundage': np.float64
+}
+
+# Header spellings of each canonical column, matched against the header in
+# lower case with everything but letters and digits removed. The legacy
+# charts quote "min./max./avg. Compond Bow Poundage (301-340 FPS)".
+COLUMN_PATTERNS = (
+    ('Shaft', r'shaft'),
+    ('TotalPointWeight', r'(total)?pointweight'),
+    ('ArrowLength', r'(arrow)?length'),
+    ('Spine', r'spine'),
+    ('LowerBoundPoundage', r'lowerboundpoundage|mincompo?u?ndbowpoundage(\d+fps)?'),
+    ('UpperBoundPoundage', r'upperboundpoundage|maxcompo?u?ndbowpoundage(\d+fps)?'),
+    ('NominalPoundage', r'nominalpoundage|avgcompo?u?ndbowpoundage(\d+fps)?')
+)
+
+# Point weight [gr] manufacturers quote their charts at, for charts without
+# the column; charts without a nominal poundage get the middle of the bounds
+DEFAULT_POINT_WEIGHT = 150.0
+
+# Columns identifying a chart row: charts list one shaft, length and spine
+# under several poundage bands, so the band is part of the key. A second row
+# with the same key is a duplicate, or a conflict if its values differ.
+KEY_COLUMNS = ('Shaft', 'TotalPointWeight', 'ArrowLength', 'Spine', 'LowerBoundPoundage', 'UpperBoundPoundage')
+VALUE_COLUMNS = ('NominalPoundage',)
+
+
+def map_columns(header):
+    """Position of each canonical column in a chart's header
+
+    Raises ValueError if a required column is missing or two columns map to
+    the same canonical one. TotalPointWeight and NominalPoundage may be
+    missing (see DEFAULT_POINT_WEIGHT).
+    """
+    positions = {}
+    for position, name in enumerate(header):
+        normalized = re.sub(r'[^a-z0-9]', '', name.lower())
+        for column, pattern in COLUMN_PATTERNS:
+            if re.fullmatch(pattern, normalized):
+                if column in positions:
+                    raise ValueError(f'columns {header[positions[column]]!r} and {name!r} both map to {column}')
+                positions[column] = position
+                break
+    missing = [column for column in CANONICAL_COLUMNS
+               if column not in positions and column not in ('TotalPointWeight', 'NominalPoundage')]
+    if missing:
+        raise ValueError(f'no column maps to {", ".join(missing)}')
+    return positions
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def parse_numbers(texts):
+    """Float array of strings, NaN where a string is not a number"""
+    try:
+        return np.array(texts, dtype=float)
+    except ValueError:
+        return np.array([_to_float(text) for text in texts], dtype=float)
+
+
+def parse_chunk(rows, positions):
+    """Canonical columns of a chunk of raw CSV rows, and which rows are valid
+
+    A valid row has a shaft name, positive finite numbers and
+    LowerBound <= Nominal <= UpperBound poundage.
+    """
+    width = max(positions.values()) + 1
+    rows = [row + [''] * (width - len(row)) for row in rows]
+    chunk = {'Shaft': np.array([row[positions['Shaft']].strip() for row in rows], dtype=object)}
+    for column in CANONICAL_COLUMNS:
+        if column != 'Shaft' and column in positions:
+            chunk[column] = parse_numbers([row[positions[column]] for row in rows])
+    if 'TotalPointWeight' not in chunk:
+        chunk['TotalPointWeight'] = np.full(len(rows), DEFAULT_POINT_WEIGHT)
+    if 'NominalPoundage' not in chunk:
+        chunk['NominalPoundage'] = (chunk['LowerBoundPoundage'] + chunk['UpperBoundPoundage']) / 2
+
+    valid = chunk['Shaft'] != ''
+    for column in CANONICAL_COLUMNS:
+        if column != 'Shaft':
+            valid &= np.isfinite(chunk[column]) & (chunk[column] > 0)
+    with np.errstate(invalid='ignore'):
+        valid &= ((chunk['LowerBoundPoundage'] <= chunk['NominalPoundage']) &
+                  (chunk['NominalPoundage'] <= chunk['UpperBoundPoundage']))
+    return chunk, valid
+
+
+def read_store_meta(directory=SPINE_STORE_DIR):
+    """The store's meta.json: format, committed rows, shaft names, digest and column dtypes"""
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format') != STORE_FORMAT:
+        raise ValueError(f'spine store {directory} has format {meta.get("format")}, expected {STORE_FORMAT}')
+    return meta
+
+
+def read_store(directory=SPINE_STORE_DIR):
+    """Committed rows of a spine store, memory-mapped
+
+    Returns the meta and {column: array}, Shaft holding codes into
+    meta['shafts'].
+    """
+    meta = read_store_meta(directory)
+    columns = {}
+    for column, dtype in meta['columns'].items():
+        if meta['rows']:
+            columns[column] = np.memmap(os.path.join(directory, f'{column}.bin'), dtype=dtype, mode='r',
+                                        shape=(meta['rows'],))
+        else:
+            columns[column] = np.empty(0, dtype=dtype)
+    return meta, columns
+
+
+def _mix(hashes):
+    """splitmix64 finalizer of a uint64 array"""
+    hashes = (hashes ^ (hashes >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    hashes = (hashes ^ (hashes >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return hashes ^ (hashes >> np.uint64(31))
+
+
+def row_hashes(columns):
+    """64-bit hash of every row of equal-length numeric columns"""
+    hashes = np.zeros(len(columns[0]), dtype=np.uint64)
+    for values in columns:
+        hashes = _mix(hashes ^ np.ascontiguousarray(values, dtype=np.float64).view(np.uint64))
+    return hashes
+
+
+class SpineStore:
+    """Append-only columnar store of canonical spine chart rows
+
+    Every column is a raw little-endian file of CANONICAL_COLUMNS dtype,
+    and meta.json records how many rows are committed, the shaft name
+    table and a digest chained over every commit. Appends go to the end of
+    the column files and become visible when commit() replaces meta.json,
+    so readers (and an interrupted ingestion) only ever see whole commits;
+    uncommitted bytes are cut off when the store is opened again or rolled
+    back. To find duplicates the store keeps a sorted array of 64-bit
+    hashes of the key of every row it holds, with a hash of its values:
+    16 bytes per distinct row. (Two keys sharing a hash, about a 1 in 10^7
+    chance among millions of rows, would drop the later row.)
+    """
+
+    def __init__(self, directory=SPINE_STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.rollback()
+
+    def _path(self, column):
+        return os.path.join(self.directory, f'{column}.bin')
+
+    def rollback(self):
+        """Drop everything appended since the last commit"""
+        try:
+            meta, columns = read_store(self.directory)
+        except FileNotFoundError:
+            meta = {'rows': 0, 'shafts': [], 'digest': ''}
+            columns = {column: np.empty(0, dtype=dtype) for column, dtype in CANONICAL_COLUMNS.items()}
+        self.rows = meta['rows']
+        self.shafts = list(meta['shafts'])
+        self.codes = {shaft: code for code, shaft in enumerate(self.shafts)}
+        self.digest = meta['digest']
+        self._digest = hashlib.sha256(self.digest.encode('utf-8'))
+
+        keys, values = [np.empty(0, dtype=np.uint64)], [np.empty(0, dtype=np.uint64)]
+        for start in range(0, self.rows, CHUNK_ROWS):
+            keys.append(row_hashes([columns[column][start:start + CHUNK_ROWS] for column in KEY_COLUMNS]))
+            values.append(row_hashes([columns[column][start:start + CHUNK_ROWS] for column in VALUE_COLUMNS]))
+        keys, values = np.concatenate(keys), np.concatenate(values)
+        order = np.argsort(keys)
+        self.keys, self.values = keys[order], values[order]
+        del columns
+
+        for column, dtype in CANONICAL_COLUMNS.items():
+            with open(self._path(column), 'ab') as f:
+                f.truncate(self.rows * np.dtype(dtype).itemsize)
+
+    def append(self, chunk, valid):
+        """Append the valid rows of a parsed chunk that the store doesn't hold yet
+
+        Returns (appended, duplicates, conflicts): conflicts are rows whose
+        key is already stored (or earlier in the chunk) with another nominal
+        poundage; the first row is kept, so charts given first take
+        precedence.
+        """
+        rows = np.flatnonzero(valid)
+        shafts = chunk['Shaft'][rows].tolist()
+        for shaft in dict.fromkeys(shafts):
+            if shaft not in self.codes:
+                self.codes[shaft] = len(self.shafts)
+                self.shafts.append(shaft)
+                self._digest.update(shaft.encode('utf-8') + b'\0')
+        codes = np.array([self.codes[shaft] for shaft in shafts], dtype=np.int32)
+
+        keys = row_hashes([codes] + [chunk[column][rows] for column in KEY_COLUMNS[1:]])
+        valueHashes = row_hashes([chunk[column][rows] for column in VALUE_COLUMNS])
+        # Every row of a key must match the values of the stored row, or
+        # else of the key's first row in the chunk, which is the one kept
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        reference = valueHashes[first]
+        position = np.searchsorted(self.keys, unique)
+        stored = position < self.keys.size
+        stored[stored] = self.keys[position[stored]] == unique[stored]
+        reference[stored] = self.values[position[stored]]
+        keep = np.zeros(rows.size, dtype=bool)
+        keep[first[~stored]] = True
+        matches = valueHashes == reference[inverse]
+        duplicates = int(np.count_nonzero(~keep & matches))
+        conflicts = int(np.count_nonzero(~keep & ~matches))
+        self.keys = np.insert(self.keys, position[~stored], unique[~stored])
+        self.values = np.insert(self.values, position[~stored], reference[~stored])
+
+        for column, dtype in CANONICAL_COLUMNS.items():
+            values = codes[keep] if column == 'Shaft' else chunk[column][rows[keep]]
+            data = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()
+            self._digest.update(data)
+            with open(self._path(column), 'ab') as f:
+                f.write(data)
+        self.rows += int(keep.sum())
+        return int(keep.sum()), duplicates, conflicts
+
+    def commit(self):
+        """Make every row appended so far visible to readers"""
+        for column in CANONICAL_COLUMNS:
+            with open(self._path(column), 'ab') as f:
+                os.fsync(f.fileno())
+        self.digest = self._digest.hexdigest()
+        meta = {
+            'format': STORE_FORMAT,
+            'rows': self.rows,
+            'shafts': self.shafts,
+            'digest': self.digest,
+            'columns': {column: np.dtype(dtype).newbyteorder('<').str for column, dtype in CANONICAL_COLUMNS.items()}
+        }
+        temporary = os.path.join(self.directory, f'meta.json.{os.getpid()}')
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temporary, os.path.join(self.directory, 'meta.json'))
+        # Chain the next commit on this one, as reopening the store does
+        self._digest = hashlib.sha256(self.digest.encode('utf-8'))
+
+
+def ingest_chart(path, store, chunk_rows=CHUNK_ROWS):
+    """Stream one chart file into a store, chunk by chunk, and commit it
+
+    Returns a report: the canonical column each header maps to and the rows
+    read, appended, invalid, duplicate and conflicting. Raises ValueError
+    if the header can't be mapped. A chart that fails part way (say, with a
+    decoding error) is rolled back, so the store commits all of a chart or
+    none of it.
+    """
+    report = {'path': path, 'read': 0, 'appended': 0, 'invalid': 0, 'duplicates': 0, 'conflicts': 0}
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                raise ValueError(f'{path} is empty')
+            positions = map_columns(header)
+            report['columns'] = {header[position]: column for column, position in positions.items()}
+            while True:
+                rows = [row for row in itertools.islice(reader, chunk_rows)]
+                if not rows:
+                    break
+                # Blank lines are not rows
+                rows = [row for row in rows if any(cell.strip() for cell in row)]
+                chunk, valid = parse_chunk(rows, positions)
+                appended, duplicates, conflicts = store.append(chunk, valid)
+                report['read'] += len(rows)
+                report['invalid'] += int((~valid).sum())
+                report['appended'] += appended
+                report['duplicates'] += duplicates
+                report['conflicts'] += conflicts
+    except BaseException:
+        store.rollback()
+        raise
+    store.commit()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream spine chart CSVs into a columnar spine store.')
+    parser.add_argument('charts', nargs='+', help='chart CSV files, in order of precedence')
+    parser.add_argument('--store', default=SPINE_STORE_DIR, help='store directory (default %(default)s)')
+    parser.add_argument('--replace', action='store_true', help='start a new store instead of appending')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='rows per chunk (default %(default)s)')
+    args = parser.parse_args()
+
+    if args.replace:
+        shutil.rmtree(args.store, ignore_errors=True)
+    store = SpineStore(args.store)
+    failed = False
+    for path in args.charts:
+        try:
+            report = ingest_chart(path, store, args.chunk_rows)
+        except (OSError, ValueError) as e:
+            print(f'{path}: skipped, {e}')
+            failed = True
+            continue
+        print(f'{path}: {report["read"]} rows, {report["appended"]} appended, {report["invalid"]} invalid, '
+              f'{report["duplicates"]} duplicates, {report["conflicts"]} conflicts')
+    print(f'{args.store}: {store.rows} rows of {len(store.shafts)} shafts')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+import numpy as np
+
+# Dormand-Prince 5(4) tableau
+_A = (
+    (),
+    (1/5,),
+    (3/40, 9/40),
+    (44/45, -56/15, 32/9),
+    (19372/6561, -25360/2187, 64448/6561, -212/729),
+    (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+    (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84),
+)
+_B = _A[6] + (0,)
+_E = (71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40)
+
+
+def integrate(rhs, y0, coefs, checkpoints, rtol=1e-6, atol=1e-9, first_step=1.0, max_steps=10000,
+              terminate=None):
+    """Integrate dy/dx = rhs(y, coefs) for a batch of independent elements
+
+    y0 has shape (n_states, n) and every coefs entry has shape (n,).
+    checkpoints has shape (n_checkpoints, n), sorted along axis 0, and holds
+    the distances at which each element's state is recorded. Every element
+    carries its own adaptive Dormand-Prince 5(4) step, lands exactly on its
+    checkpoints and drops out of the batch once its last checkpoint is
+    recorded or terminate(y, coefs) flags it. Checkpoints an element never
+    reaches are NaN. Returns an array of shape (n_checkpoints, n_states, n).
+    """
+    y0 = np.asarray(y0, dtype=float)
+    checkpoints = np.asarray(checkpoints, dtype=float)
+    n_states, n = y0.shape
+    n_checkpoints = checkpoints.shape[0]
+
+    out = np.full((n_checkpoints, n_states, n), np.nan)
+    x = np.zeros(n)
+    y = y0.copy()
+    h = np.full(n, float(first_step))
+    nxt = np.zeros(n, dtype=int)
+
+    # Checkpoints at (or before) the muzzle are recorded straight away
+    while True:
+        at_start = (nxt < n_checkpoints)
+        at_start[at_start] = checkpoints[nxt[at_start], np.flatnonzero(at_start)] <= 0
+        if not at_start.any():
+            break
+        idx = np.flatnonzero(at_start)
+        out[nxt[idx], :, idx] = y[:, idx].T
+        nxt[idx] += 1
+
+    active = np.flatnonzero(nxt < n_checkpoints)
+    for _ in range(max_steps):
+        if active.size == 0:
+            break
+        ya = y[:, active]
+        ca = {name: value[active] for name, value in coefs.items()}
+        target = checkpoints[nxt[active], active]
+        ha = np.minimum(h[active], target - x[active])
+
+        stages = []
+        for row in _A:
+            yi = ya.copy()
+            for a, ki in zip(row, stages):
+                if a:
+                    yi += (a * ha) * ki
+            stages.append(rhs(yi, ca))
+        y_new = ya + ha * sum(b * ki for b, ki in zip(_B, stages) if b)
+        err = ha * sum(e * ki for e, ki in zip(_E, stages) if e)
+
+        scale = atol + rtol * np.maximum(np.abs(ya), np.abs(y_new))
+        err_norm = np.nanmax(np.abs(err) / scale, axis=0)
+        accepted = err_norm <= 1
+        with np.errstate(divide='ignore'):
+            factor = np.clip(0.9 * err_norm**-0.2, 0.2, 5.0)
+        h[active] = ha * np.where(np.isfinite(factor), factor, 0.2)
+
+        acc = active[accepted]
+        x[acc] += ha[accepted]
+        y[:, acc] = y_new[:, accepted]
+
+        # Record every checkpoint reached by this step (duplicates included)
+        reached = acc[x[acc] >= checkpoints[nxt[acc], acc] * (1 - 1e-12)]
+        while reached.size:
+            out[nxt[reached], :, reached] = y[:, reached].T
+            nxt[reached] += 1
+            reached = reached[nxt[reached] < n_checkpoints]
+            reached = reached[x[reached] >= checkpoints[nxt[reached], reached] * (1 - 1e-12)]
+
+        done = nxt[active] >= n_checkpoints
+        if terminate is not None:
+            done |= terminate(y[:, active], {name: value[active] for name, value in coefs.items()})
+        active = active[~done]
+    if active.size:
+        raise RuntimeError(f'integration did not finish within {max_steps} steps')
+
+    return out
@@ -0,0 +1,380 @@
+import numpy as np
+
+from integrator import integrate
+
+AIR_DENSITY = 0.0752  # lb/ft^3
+GRAVITY = 32.174  # ft/s^2
+
+# A flight descending steeper than this slope (about 87 degrees) has all but
+# stopped moving downrange, and is not followed further
+MAX_DESCENT_SLOPE = 20.0
+
+# Launch slopes sampled to bracket a launch angle the secant solve missed
+LAUNCH_SLOPE_GRID = 33
+
+
+def drag_constant(area_cross_section, coefficient_drag, arrow_mass):
+    """Return k [1/ft] for the quadratic drag deceleration a = -k * v**2"""
+    return 0.5 * AIR_DENSITY * area_cross_section * coefficient_drag / np.asarray(arrow_mass, dtype=float)
+
+
+def _distance_factors(k, distance):
+    """Return exp(k*x) and expm1(k*x)/k, the latter taken to x as k -> 0"""
+    kx = k * distance
+    growth = np.exp(kx)
+    # expm1(kx)/k is well defined for k == 0 (no drag), where it reduces to x
+    safe_k = np.where(k > 0, k, 1.0)
+    stretch = np.where(k > 0, np.expm1(kx) / safe_k, distance)
+    return growth, stretch
+
+
+# Drag models map (velocity [fps], per-element coefficients) -> deceleration [ft/s^2]
+# along the line of flight. The coefficients dict carries the constant-Cd quadratic
+# constant 'k' as well as the 'area' [ft^2], 'cd' and 'mass' [lb] it came from.
+# Passing one as drag_model switches calculate_speed/calculate_time/calculate_trajectory
+# from the closed form to the batched integrator.
+
+def quadratic_drag(velocity, coefs):
+    """Constant Cd drag, a = k * v**2 (the closed form used when drag_model is None)"""
+    return coefs['k'] * velocity**2
+
+
+def velocity_dependent_drag(velocities, cd_factors):
+    """Drag with Cd scaled by a factor interpolated from a (velocity, factor) table"""
+    velocities = np.asarray(velocities, dtype=float)
+    cd_factors = np.asarray(cd_factors, dtype=float)
+
+    def model(velocity, coefs):
+        return coefs['k'] * np.interp(velocity, velocities, cd_factors) * velocity**2
+    return model
+
+
+def shaft_fletch_drag(shaft_area, shaft_cd, fletch_cd, shaft_cd_exponent=-0.5, reference_velocity=300):
+    """Separate shaft and fletching drag terms
+
+    The fletching keeps a constant Cd over the rest of the cross section while
+    the shaft's skin-friction Cd scales with (v/reference_velocity)**shaft_cd_exponent
+    (-0.5 for a laminar boundary layer).
+    """
+    def model(velocity, coefs):
+        fletch_area = np.maximum(coefs['area'] - shaft_area, 0)
+        shaft_term = shaft_area * shaft_cd * (velocity / reference_velocity)**shaft_cd_exponent
+        return 0.5 * AIR_DENSITY * (shaft_term + fletch_area * fletch_cd) * velocity**2 / coefs['mass']
+    return model
+
+
+def with_gravity(model, launch_angle):
+    """Couple gravity into a drag model for a flight launched at launch_angle [deg]"""
+    along_flight = GRAVITY * np.sin(np.radians(launch_angle))
+
+    def coupled(velocity, coefs):
+        return model(velocity, coefs) + along_flight
+    return coupled
+
+
+def _flight_rhs(model):
+    """Right-hand side in distance for the state (velocity, time of flight)"""
+    def rhs(y, coefs):
+        velocity = y[0]
+        return np.stack((-model(velocity, coefs) / velocity, 1 / velocity))
+    return rhs
+
+
+def integrate_flight(drag_model, initial_velocity, area_cross_section, coefficient_drag, arrow_mass, checkpoints,
+                     rtol=1e-8, atol=1e-10, stall_velocity=1.0):
+    """Velocity and time of flight at every checkpoint [ft] for an arbitrary drag model
+
+    initial_velocity, area_cross_section, coefficient_drag and arrow_mass [lb]
+    broadcast to an element shape, and checkpoints has shape (n_checkpoints,)
+    + element shape (or broadcasts to it). All elements are advanced together
+    by integrator.integrate to a relative tolerance of rtol; an element that
+    slows below stall_velocity reports NaN at the checkpoints it never reaches.
+    Returns (velocity, time), each shaped like the broadcast checkpoints.
+    """
+    v0 = np.asarray(initial_velocity, dtype=float)
+    checkpoints = np.asarray(checkpoints, dtype=float)
+    shape = np.broadcast_shapes(v0.shape, np.shape(area_cross_section), np.shape(coefficient_drag),
+                                np.shape(arrow_mass), checkpoints.shape[1:])
+    checkpoints = np.broadcast_to(checkpoints, checkpoints.shape[:1] + shape).reshape(checkpoints.shape[0], -1)
+    order = np.argsort(checkpoints, axis=0, kind='stable')
+
+    def flat(value):
+        return np.broadcast_to(np.asarray(value, dtype=float), shape).ravel()
+
+    area, cd, mass = flat(area_cross_section), flat(coefficient_drag), flat(arrow_mass)
+    coefs = {'k': drag_constant(area, cd, mass), 'area': area, 'cd': cd, 'mass': mass}
+    out = integrate(_flight_rhs(drag_model), np.stack((flat(v0), np.zeros(area.size))), coefs,
+                    np.take_along_axis(checkpoints, order, axis=0), rtol=rtol, atol=atol,
+                    terminate=lambda y, c: y[0] <= stall_velocity)
+
+    # Undo the per-element checkpoint sort
+    velocity, time = np.empty_like(checkpoints), np.empty_like(checkpoints)
+    np.put_along_axis(velocity, order, out[:, 0], axis=0)
+    np.put_along_axis(time, order, out[:, 1], axis=0)
+    full_shape = (checkpoints.shape[0],) + shape
+    return velocity.reshape(full_shape), time.reshape(full_shape)
+
+
+def calculate_speed(initial_velocity, area_cross_section, coefficient_drag, arrow_mass, distance,
+                    drag_model=None):
+    """Calculate arrow velocity at given distance using drag model
+
+    Under pure v**2 drag dv/dx = -k*v, so v(x) = v0 * exp(-k*x). Inputs
+    broadcast against each other, so whole poundage arrays (and distance
+    grids) are evaluated in one expression. Any other drag_model is solved by
+    integrate_flight over the same broadcast inputs.
+    """
+    if drag_model is not None:
+        return integrate_flight(drag_model, initial_velocity, area_cross_section, coefficient_drag,
+                                arrow_mass, np.expand_dims(distance, 0))[0][0]
+    v0 = np.asarray(initial_velocity, dtype=float)
+    k = drag_constant(area_cross_section, coefficient_drag, arrow_mass)
+    growth, _ = _distance_factors(k, np.asarray(distance, dtype=float))
+    return v0 / growth
+
+
+def calculate_time(initial_velocity, area_cross_section, coefficient_drag, arrow_mass, distance,
+                   drag_model=None):
+    """Calculate time of flight to given distance
+
+    Integrating dt/dx = exp(k*x)/v0 gives t(x) = (exp(k*x) - 1) / (k*v0).
+    """
+    if drag_model is not None:
+        return integrate_flight(drag_model, initial_velocity, area_cross_section, coefficient_drag,
+                                arrow_mass, np.expand_dims(distance, 0))[1][0]
+    v0 = np.asarray(initial_velocity, dtype=float)
+    k = drag_constant(area_cross_section, coefficient_drag, arrow_mass)
+    _, stretch = _distance_factors(k, np.asarray(distance, dtype=float))
+    return stretch / v0
+
+
+def _path_rhs(drag_model):
+    """Right-hand side in horizontal distance for the state (vx, slope, height, time)
+
+    With the drag deceleration a(v) acting against the velocity and gravity
+    acting down, dvx/dx = -a/v, d(slope)/dx = -g/vx**2, dy/dx = slope and
+    dt/dx = 1/vx, where v = vx * sqrt(1 + slope**2).
+    """
+    def rhs(y, coefs):
+        vx, slope = y[0], y[1]
+        velocity = vx * np.sqrt(1 + slope**2)
+        return np.stack((-drag_model(velocity, coefs) / velocity,
+                         -GRAVITY / vx**2,
+                         slope,
+                         1 / vx))
+    return rhs
+
+
+def calculate_path(initial_velocity, area_cross_section, coefficient_drag, arrow_mass, launch_slope, distances,
+                   drag_model=None, rtol=1e-8, atol=1e-10):
+    """Height [ft] and time of flight at each horizontal distance [ft] for a 2D flight under gravity
+
+    launch_slope is tan(launch angle). As with integrate_flight, the inputs
+    broadcast to an element shape and distances has shape (n_distances,) +
+    element shape (or broadcasts to it); every element is integrated in one
+    batch. drag_model defaults to constant-Cd quadratic drag. Distances a
+    flight doesn't get to before it stalls or falls steeper than
+    MAX_DESCENT_SLOPE are NaN.
+    """
+    drag_model = quadratic_drag if drag_model is None else drag_model
+    v0 = np.asarray(initial_velocity, dtype=float)
+    slope = np.asarray(launch_slope, dtype=float)
+    distances = np.asarray(distances, dtype=float)
+    shape = np.broadcast_shapes(v0.shape, slope.shape, np.shape(area_cross_section), np.shape(coefficient_drag),
+                                np.shape(arrow_mass), distances.shape[1:])
+    distances = np.broadcast_to(distances, distances.shape[:1] + shape).reshape(distances.shape[0], -1)
+    order = np.argsort(distances, axis=0, kind='stable')
+
+    def flat(value):
+        return np.broadcast_to(np.asarray(value, dtype=float), shape).ravel()
+
+    area, cd, mass = flat(area_cross_section), flat(coefficient_drag), flat(arrow_mass)
+    coefs = {'k': drag_constant(area, cd, mass), 'area': area, 'cd': cd, 'mass': mass}
+    slope = flat(slope)
+    vx0 = flat(v0) / np.sqrt(1 + slope**2)
+    y0 = np.stack((vx0, slope, np.zeros(area.size), np.zeros(area.size)))
+    out = integrate(_path_rhs(drag_model), y0, coefs, np.take_along_axis(distances, order, axis=0),
+                    rtol=rtol, atol=atol, terminate=lambda y, c: (y[0] <= 1.0) | (y[1] < -MAX_DESCENT_SLOPE))
+
+    height, time = np.empty_like(distances), np.empty_like(distances)
+    np.put_along_axis(height, order, out[:, 2], axis=0)
+    np.put_along_axis(time, order, out[:, 3], axis=0)
+    full_shape = (distances.shape[0],) + shape
+    return height.reshape(full_shape), time.reshape(full_shape)
+
+
+def flat_fire_drop(initial_velocity, area_cross_section, coefficient_drag, arrow_mass, distance):
+    """Gravity drop [ft] below the launch line under the flat-fire approximation
+
+    Integrating d(slope)/dx = -g/vx**2 twice with vx = v0*exp(-k*x) gives
+    g/v0**2 * (exp(2kx) - 1 - 2kx) / (4k**2).
+    """
+    v0 = np.asarray(initial_velocity, dtype=float)
+    x = np.asarray(distance, dtype=float)
+    k = drag_constant(area_cross_section, coefficient_drag, arrow_mass)
+    u = 2 * k * x
+    # (exp(u) - 1 - u) / u**2 loses precision for small u, where its series 1/2 + u/6 takes over
+    safe_u = np.where(u > 1e-4, u, 1.0)
+    ratio = np.where(u > 1e-4, (np.expm1(safe_u) - safe_u) / safe_u**2, 0.5 + u/6)
+    return GRAVITY / v0**2 * x**2 * ratio
+
+
+def solve_launch_angle(initial_velocity, area_cross_section, coefficient_drag, arrow_mass, target_distance,
+                       target_height=0.0, drag_model=None, tol=1e-6, max_iter=20):
+    """Return tan(launch angle) that puts the 2D flight at target_height [ft] at target_distance [ft]
+
+    Solved for every broadcast element at once: the flat-fire drop seeds the
+    slope and a secant iteration on the still unconverged elements refines it,
+    each iteration being one batched calculate_path call. Height is close to
+    linear in the launch slope, so this usually converges in 2-3 iterations.
+    Launch angles are kept within 45 degrees. Elements the secant misses
+    (targets near or past the arrow's range) are bracketed on a grid of
+    LAUNCH_SLOPE_GRID launch slopes and refined by regula falsi; a target no
+    slope on the grid reaches is out of range and gets NaN.
+    """
+    v0 = np.asarray(initial_velocity, dtype=float)
+    shape = np.broadcast_shapes(v0.shape, np.shape(area_cross_section), np.shape(coefficient_drag),
+                                np.shape(arrow_mass), np.shape(target_distance), np.shape(target_height))
+
+    def flat(value):
+        return np.broadcast_to(np.asarray(value, dtype=float), shape).ravel()
+
+    v0, area, cd, mass = flat(v0), flat(area_cross_section), flat(coefficient_drag), flat(arrow_mass)
+    x, target = flat(target_distance), flat(target_height)
+    if np.any(x <= 0):
+        raise ValueError('target distance must be positive')
+
+    def miss(slope, idx):
+        height, _ = calculate_path(v0[idx], area[idx], cd[idx], mass[idx], slope, x[idx][None],
+                                   drag_model=drag_model)
+        return height[0] - target[idx]
+
+    # Two starting points: the flat-fire solution and a Newton-like correction of it
+    slope_prev = np.clip((target + flat_fire_drop(v0, area, cd, mass, x)) / x, -1, 1)
+    all_idx = np.arange(v0.size)
+    miss_prev = miss(slope_prev, all_idx)
+    slope = np.clip(slope_prev - np.nan_to_num(miss_prev) / x, -1, 1)
+    pending, lost = all_idx, []
+    for _ in range(max_iter):
+        miss_now = miss(slope[pending], pending)
+        converged = np.abs(miss_now) <= tol
+        denom = miss_now - miss_prev[pending]
+        step = np.where(denom != 0, miss_now * (slope[pending] - slope_prev[pending]) / np.where(denom != 0, denom, 1),
+                        miss_now / x[pending])
+        step = np.where(np.isfinite(step), step, miss_now / x[pending])
+        slope_prev[pending], miss_prev[pending] = slope[pending], miss_now
+        slope[pending] = np.clip(slope[pending] - np.where(converged, 0, step), -1, 1)
+        # A flight that never gets to the target leaves the secant nothing to go on
+        reached = np.isfinite(miss_now)
+        lost.append(pending[~reached])
+        pending = pending[reached & ~converged]
+        if pending.size == 0:
+            break
+    pending = np.concatenate(lost + [pending])
+    if pending.size == 0:
+        return slope.reshape(shape)
+
+    # Bracket the rest between the line to the target, which gravity keeps
+    # the flight below, and 45 degrees: the first grid slope whose flight
+    # passes at or above the target and the one before it
+    low = np.minimum(target[pending] / x[pending], 1)
+    grid = low + (1 - low) * np.linspace(0, 1, LAUNCH_SLOPE_GRID)[:, None]
+    height, _ = calculate_path(v0[pending], area[pending], cd[pending], mass[pending], grid,
+                               x[pending][None, None], drag_model=drag_model)
+    above = height[0] >= target[pending]
+    reachable = above.any(axis=0)
+    slope[pending[~reachable]] = np.nan
+    pending, grid, above = pending[reachable], grid[:, reachable], above[:, reachable]
+    first = np.argmax(above, axis=0)
+    columns = np.arange(pending.size)
+    lo, hi = grid[np.maximum(first - 1, 0), columns], grid[first, columns]
+    miss_lo, miss_hi = miss(lo, pending), miss(hi, pending)
+    # A flight that never gets to the target passes below it
+    miss_lo = np.where(np.isnan(miss_lo), -1, miss_lo)
+
+    # Illinois regula falsi: the end kept twice in a row has its miss halved
+    for _ in range(max_iter):
+        if pending.size == 0:
+            return slope.reshape(shape)
+        new = np.where(miss_hi != miss_lo, hi - miss_hi * (hi - lo) / np.where(miss_hi != miss_lo, miss_hi - miss_lo, 1),
+                       hi)
+        miss_new = miss(new, pending)
+        converged = np.abs(miss_new) <= tol
+        slope[pending[converged]] = new[converged]
+        swap = miss_new * miss_hi < 0
+        lo, miss_lo = np.where(swap, hi, lo), np.where(swap, miss_hi, miss_lo / 2)
+        hi, miss_hi = new, miss_new
+        keep = ~converged
+        pending, lo, hi, miss_lo, miss_hi = pending[keep], lo[keep], hi[keep], miss_lo[keep], miss_hi[keep]
+    if pending.size:
+        raise RuntimeError('launch angle solve did not converge')
+    return slope.reshape(shape)
+
+
+def calculate_sight_tape(initial_velocity, area_cross_section, coefficient_drag, arrow_mass, tape_distances,
+                         zero_distance, sight_radius=30.0, sight_height=0.0, drag_model=None):
+    """Pin offsets [in] for every tape distance [ft] relative to the pin zeroed at zero_distance [ft]
+
+    The eye sits sight_height [in] above the arrow and the pin sight_radius
+    [in] in front of it. For each tape distance the launch angle that hits a
+    target level with the arrow is solved (all elements and distances in one
+    batch) and the pin goes where the sight line crosses the sight window, so
+    offsets are positive downward for distances past the zero. Returns
+    (offsets, launch_slopes, zero_slope): offsets and launch_slopes have shape
+    (n_distances,) + element shape, zero_slope the element shape.
+    """
+    tape_distances = np.asarray(tape_distances, dtype=float)
+    v0 = np.asarray(initial_velocity, dtype=float)
+    shape = np.broadcast_shapes(v0.shape, np.shape(area_cross_section), np.shape(coefficient_drag),
+                                np.shape(arrow_mass))
+    x = np.concatenate((np.broadcast_to(np.asarray(zero_distance, dtype=float), (1,) + shape),
+                        np.broadcast_to(tape_distances.reshape(tape_distances.shape + (1,) * len(shape)),
+                                        tape_distances.shape + shape)))
+    slopes = solve_launch_angle(v0, area_cross_section, coefficient_drag, arrow_mass, x)
+
+    # Angle between the arrow and the sight line to the target, seen through the pin
+    sight_angle = np.arctan(slopes) + np.arctan(sight_height / 12 / x)
+    pins = sight_radius * np.tan(sight_angle)
+    return pins[1:] - pins[:1], slopes[1:], slopes[0]
+
+
+def kinetic_energy(arrow_mass_grains, velocity):
+    """Kinetic energy [J] of an arrow of given mass [gr] moving at velocity [fps]"""
+    return 0.5 * ((arrow_mass_grains/15.43)/1000) * (velocity * 0.3048)**2
+
+
+def momentum(arrow_mass_grains, velocity):
+    """Momentum [kg*m/s] of an arrow of given mass [gr] moving at velocity [fps]"""
+    return ((arrow_mass_grains/15.43)/1000) * (velocity * 0.3048)
+
+
+def calculate_trajectory(initial_velocity, area_cross_section, coefficient_drag, arrow_mass_grains, distances,
+                         drag_model=None):
+    """Evaluate velocity, time of flight, KE and momentum at every checkpoint distance [ft]
+
+    The flight is evaluated once for all checkpoints: exp(k*x) is computed a
+    single time per (distance, element) and shared between the speed and time
+    solutions, and a drag_model integration records every checkpoint on the
+    way out. Every returned array has shape (len(distances),) + the
+    broadcast shape of the other inputs.
+    """
+    v0 = np.asarray(initial_velocity, dtype=float)
+    mass = np.asarray(arrow_mass_grains, dtype=float)
+    distances = np.asarray(distances, dtype=float)
+    element_shape = np.broadcast_shapes(v0.shape, mass.shape, np.shape(area_cross_section),
+                                        np.shape(coefficient_drag))
+    x = distances.reshape(distances.shape + (1,) * len(element_shape))
+
+    if drag_model is not None:
+        velocity, tof = integrate_flight(drag_model, v0, area_cross_section, coefficient_drag, mass / 7000, x)
+    else:
+        k = drag_constant(area_cross_section, coefficient_drag, mass / 7000)
+        growth, stretch = _distance_factors(k, x)
+        velocity, tof = v0 / growth, stretch / v0
+    return {
+        'distance': distances,
+        'velocity': velocity,
+        'tof': tof,
+        'ke': kinetic_energy(mass, velocity),
+        'momentum': momentum(mass, velocity),
+    }
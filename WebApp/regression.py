@@ -0,0 +1,336 @@
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from ingest import read_store, read_store_meta
+
+# Get the directory where this script is located
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# A spine chart CSV, or a spine store directory built by ingest.py
+SPINE_CHART_PATH = os.path.join(BASE_DIR, os.environ.get('SPINE_CHART_PATH', 'ArrowSpine3.csv'))
+
+# Fitted coefficients, keyed by the spine chart's content hash (python regression.py refits it)
+MODEL_CACHE_PATH = os.path.join(BASE_DIR, 'spine_model.json')
+
+# Poundage columns of the spine chart ('<type>Poundage') and the arrow lengths
+# [in] fitted, as in the notebook
+POUNDAGE_TYPES = ('Nominal', 'LowerBound', 'UpperBound')
+FIT_ARROW_LENGTHS = tuple(range(26, 32))
+
+# Point weight [gr] the fitted rows are quoted at: the equation's 150 gr
+# starting point; rows for other points are left out of the fit
+FIT_POINT_WEIGHT = 150
+
+# Model fit from every brand's rows; the others are named by their brand
+AGGREGATE_MODEL = 'aggregate'
+
+# Coefficients of a model for one poundage type: poundage = (slopeSlope *
+# arrowLength + slopeIntercept) * spine + intSlope * arrowLength + intIntercept
+MODEL_COEFFICIENTS = ('slopeSlope', 'slopeIntercept', 'intSlope', 'intIntercept')
+
+# Bumped when the cached model's layout changes, invalidating older caches
+MODEL_FORMAT = 3
+
+# Decimals the notebook rounds to: the per-length spine fits, then the
+# coefficients of those fits against arrow length
+LENGTH_FIT_DECIMALS = 2
+MODEL_DECIMALS = 3
+
+# Manufacturer charts' poundage adder [lb] for the bow's IBO speed [fps]; the
+# fit is rounded the way the point weight equation quotes it (0.252, -81.8)
+IBO_ADJUSTMENTS = ((300, -5), (320, 0), (345, 5), (350, 10), (300, -5),
+                   (330, 0), (315, -5), (330, 0), (300, -5), (330, 0))
+IBO_DECIMALS = (3, 1)
+
+
+def read_spine_chart(path=SPINE_CHART_PATH):
+    """Read the spine chart into column arrays
+
+    Returns 'shaft' (object array), 'arrowLength', 'spine' and one
+    '<type>Poundage' float array per POUNDAGE_TYPES, one entry per row
+    quoted at FIT_POINT_WEIGHT. Raises ValueError for a chart with missing
+    columns or invalid numbers. path may also be a spine store directory.
+    """
+    if os.path.isdir(path):
+        return read_spine_store(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [row for row in csv.DictReader(f) if row.get('Shaft')]
+    columns = ['ArrowLength', 'Spine'] + [f'{poundageType}Poundage' for poundageType in POUNDAGE_TYPES]
+    try:
+        rows = [row for row in rows
+                if float(row.get('TotalPointWeight') or FIT_POINT_WEIGHT) == FIT_POINT_WEIGHT]
+        data = {
+            'shaft': np.array([row['Shaft'] for row in rows], dtype=object),
+            'arrowLength': np.array([row['ArrowLength'] for row in rows], dtype=float),
+            'spine': np.array([row['Spine'] for row in rows], dtype=float)
+        }
+        for poundageType in POUNDAGE_TYPES:
+            data[f'{poundageType}Poundage'] = np.array([row[f'{poundageType}Poundage'] for row in rows],
+                                                       dtype=float)
+    except KeyError:
+        raise ValueError(f'spine chart {path} needs the columns Shaft, {", ".join(columns)}') from None
+    except ValueError as e:
+        raise ValueError(f'spine chart {path}: {e}') from None
+    if not rows:
+        raise ValueError(f'spine chart {path} has no rows')
+    if not (np.all(data['arrowLength'] > 0) and np.all(data['spine'] > 0)):
+        raise ValueError(f'spine chart {path} has non-positive arrow lengths or spines')
+    return data
+
+
+def read_spine_store(directory):
+    """Rows of a spine store (see ingest.py) quoted at FIT_POINT_WEIGHT, as read_spine_chart returns them
+
+    The store's rows are validated on ingestion.
+    """
+    meta, columns = read_store(directory)
+    rows = np.flatnonzero(columns['TotalPointWeight'] == FIT_POINT_WEIGHT)
+    if not rows.size:
+        raise ValueError(f'spine store {directory} has no rows at {FIT_POINT_WEIGHT} gr')
+    data = {
+        'shaft': np.array(meta['shafts'], dtype=object)[columns['Shaft'][rows]],
+        'arrowLength': np.asarray(columns['ArrowLength'][rows]),
+        'spine': np.asarray(columns['Spine'][rows])
+    }
+    for poundageType in POUNDAGE_TYPES:
+        data[f'{poundageType}Poundage'] = np.asarray(columns[f'{poundageType}Poundage'][rows])
+    return data
+
+
+def grouped_linear_fit(x, y, groups, numGroups):
+    """Least-squares line y = slope*x + intercept per group, all groups at once
+
+    groups holds each point's group number in range(numGroups). Closed form
+    from the per-group sums; a group with fewer than two distinct x gets NaN.
+    Returns (slopes, intercepts).
+    """
+    n = np.bincount(groups, minlength=numGroups).astype(float)
+    sumX = np.bincount(groups, x, numGroups)
+    sumY = np.bincount(groups, y, numGroups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        meanX, meanY = sumX / n, sumY / n
+        dx = x - meanX[groups]
+        sxx = np.bincount(groups, dx * dx, numGroups)
+        sxy = np.bincount(groups, dx * (y - meanY[groups]), numGroups)
+        slopes = np.where(sxx > 0, sxy / sxx, np.nan)
+    return slopes, meanY - slopes * meanX
+
+
+def _digest(values):
+    return hashlib.sha256(repr(values).encode('utf-8')).hexdigest()[:16]
+
+
+def group_digests(data, poundageType):
+    """Digest of the rows of every first-stage group of a poundage type
+
+    A group is one model at one of FIT_ARROW_LENGTHS: a brand's rows at that
+    length, or all of them for the aggregate. Returns {(model, arrowLength):
+    digest} for the groups that have rows; a group needs refitting exactly
+    when its digest changes.
+    """
+    rows = {}
+    for shaft, arrowLength, spine, poundage in zip(data['shaft'], data['arrowLength'], data['spine'],
+                                                   data[f'{poundageType}Poundage']):
+        if arrowLength in FIT_ARROW_LENGTHS and np.isfinite(poundage):
+            rows.setdefault((shaft, float(arrowLength)), []).append((float(spine), float(poundage)))
+    digests = {group: _digest(sorted(values)) for group, values in rows.items()}
+    for arrowLength in FIT_ARROW_LENGTHS:
+        brands = sorted(digest for (_, length), digest in digests.items() if length == arrowLength)
+        if brands:
+            digests[(AGGREGATE_MODEL, float(arrowLength))] = _digest(brands)
+    return digests
+
+
+def fit_first_stage(data, poundageType, groups):
+    """Per-length spine to poundage fits of the given (model, arrowLength) groups, in one pass
+
+    Returns {group: (slope, intercept)}. As in the notebook, the aggregate's
+    fits are rounded to LENGTH_FIT_DECIMALS and the brands' are not.
+    """
+    groups = list(groups)
+    if not groups:
+        return {}
+    poundage = data[f'{poundageType}Poundage']
+    valid = np.isfinite(poundage)
+    members, ids = [], []
+    for i, (model, arrowLength) in enumerate(groups):
+        rows = valid & (data['arrowLength'] == arrowLength)
+        if model != AGGREGATE_MODEL:
+            rows &= data['shaft'] == model
+        members.append(np.flatnonzero(rows))
+        ids.append(np.full(members[-1].size, i, dtype=np.intp))
+    members = np.concatenate(members)
+    slopes, intercepts = grouped_linear_fit(data['spine'][members], poundage[members], np.concatenate(ids),
+                                            len(groups))
+    aggregate = np.array([model == AGGREGATE_MODEL for model, _ in groups])
+    slopes = np.where(aggregate, slopes.round(LENGTH_FIT_DECIMALS), slopes)
+    intercepts = np.where(aggregate, intercepts.round(LENGTH_FIT_DECIMALS), intercepts)
+    return {group: (float(slope), float(intercept)) for group, slope, intercept in zip(groups, slopes, intercepts)}
+
+
+def fit_second_stage(firstStage, models):
+    """Coefficients of the given models from their per-length fits, in one pass
+
+    For each model, the slopes and the intercepts of its fitted lengths are
+    fit linearly against arrow length. Returns {model: {coefficient: value}},
+    leaving out models with fewer than two fitted lengths.
+    """
+    index = {model: i for i, model in enumerate(models)}
+    x, y, ids = [], [], []
+    for (model, arrowLength), (slope, intercept) in firstStage.items():
+        if model in index and np.isfinite(slope):
+            x += [arrowLength, arrowLength]
+            y += [slope, intercept]
+            ids += [2 * index[model], 2 * index[model] + 1]
+    coefSlopes, coefIntercepts = grouped_linear_fit(np.array(x, dtype=float), np.array(y, dtype=float),
+                                                    np.array(ids, dtype=np.intp), 2 * len(models))
+    coefSlopes = coefSlopes.round(MODEL_DECIMALS).reshape(-1, 2)
+    coefIntercepts = coefIntercepts.round(MODEL_DECIMALS).reshape(-1, 2)
+    return {model: dict(zip(MODEL_COEFFICIENTS, (float(coefSlopes[i, 0]), float(coefIntercepts[i, 0]),
+                                                 float(coefSlopes[i, 1]), float(coefIntercepts[i, 1]))))
+            for model, i in index.items() if np.isfinite(coefSlopes[i]).all()}
+
+
+def fit_ibo_model():
+    """Poundage adder [lb] as a linear function of IBO [fps]"""
+    ibo, adder = np.array(IBO_ADJUSTMENTS, dtype=float).T
+    slopes, intercepts = grouped_linear_fit(ibo, adder, np.zeros(ibo.size, dtype=np.intp), 1)
+    return {'slope': float(slopes[0].round(IBO_DECIMALS[0])),
+            'intercept': float(intercepts[0].round(IBO_DECIMALS[1]))}
+
+
+class SpineModel:
+    """Fitted point weight models of one spine chart
+
+    models maps the aggregate and each brand with a fit for every poundage
+    type to {poundage type: coefficients}; ibo is the IBO adder. groups keeps
+    every first-stage fit with the digest of its rows ({poundage type:
+    {(model, arrowLength): (digest, slope, intercept)}}) for incremental
+    refits, and key identifies the chart content. The models are also held
+    as one table, coefficients[model, poundage type, coefficient] in the
+    order of names, POUNDAGE_TYPES and MODEL_COEFFICIENTS, so choosing a
+    model is a single lookup.
+    """
+
+    def __init__(self, models, ibo, groups, key, refitGroups=0):
+        self.models = models
+        self.ibo = ibo
+        self.groups = groups
+        self.key = key
+        self.refitGroups = refitGroups
+        self.names = tuple(models)
+        self.coefficients = np.array([[[models[name][poundageType][coefficient]
+                                        for coefficient in MODEL_COEFFICIENTS]
+                                       for poundageType in POUNDAGE_TYPES]
+                                      for name in self.names], dtype=float).reshape(-1, len(POUNDAGE_TYPES),
+                                                                                    len(MODEL_COEFFICIENTS))
+        if AGGREGATE_MODEL not in models or not np.isfinite(self.coefficients).all():
+            raise ValueError('the spine chart does not give a complete aggregate model')
+
+    def index(self, name):
+        """Row of a model in coefficients"""
+        try:
+            return self.names.index(name)
+        except ValueError:
+            raise ValueError(f'unknown spineModel {name!r}, use one of {", ".join(self.names)}') from None
+
+    def to_json(self):
+        return {
+            'key': self.key,
+            'models': self.models,
+            'ibo': self.ibo,
+            'groups': {poundageType: [[model, arrowLength, *fit] for (model, arrowLength), fit in groups.items()]
+                       for poundageType, groups in self.groups.items()}
+        }
+
+    @classmethod
+    def from_json(cls, document):
+        groups = {poundageType: {(model, arrowLength): tuple(fit) for model, arrowLength, *fit in groups}
+                  for poundageType, groups in document['groups'].items()}
+        return cls(document['models'], document['ibo'], groups, document['key'])
+
+
+def fit_model(data, key, previous=None):
+    """Fit every point weight model of a spine chart
+
+    With a previous SpineModel only the first-stage groups whose rows
+    changed are refit, and only the models with such a group (or a group
+    that disappeared) go through the second stage again; everything else is
+    carried over. The result is the same as a full fit.
+    """
+    groups = {}
+    fits = {}
+    refitGroups = 0
+    for poundageType in POUNDAGE_TYPES:
+        digests = group_digests(data, poundageType)
+        old = previous.groups.get(poundageType, {}) if previous is not None else {}
+        changed = [group for group, digest in digests.items() if group not in old or old[group][0] != digest]
+        refit = fit_first_stage(data, poundageType, changed)
+        refitGroups += len(changed)
+        groups[poundageType] = {group: (digest,) + (refit[group] if group in refit else tuple(old[group][1:]))
+                                for group, digest in digests.items()}
+
+        names = sorted({model for model, _ in digests}, key=lambda model: (model != AGGREGATE_MODEL, model))
+        touched = {model for model, _ in changed} | {model for model, _ in old.keys() - digests.keys()}
+        redo = [model for model in names
+                if previous is None or model in touched or model not in previous.models]
+        firstStage = {group: fit[1:] for group, fit in groups[poundageType].items()}
+        fits[poundageType] = fit_second_stage(firstStage, redo)
+        for model in names:
+            if model not in redo:
+                fits[poundageType][model] = previous.models[model][poundageType]
+
+    names = sorted(fits[POUNDAGE_TYPES[0]], key=lambda model: (model != AGGREGATE_MODEL, model))
+    models = {name: {poundageType: fits[poundageType][name] for poundageType in POUNDAGE_TYPES}
+              for name in names if all(name in fit for fit in fits.values())}
+    return SpineModel(models, fit_ibo_model(), groups, key, refitGroups)
+
+
+def chart_key(path=SPINE_CHART_PATH):
+    """Identity of a spine chart's content (and of the model format)"""
+    if os.path.isdir(path):
+        return f'{MODEL_FORMAT}:{read_store_meta(path)["digest"]}'
+    with open(path, 'rb') as f:
+        return f'{MODEL_FORMAT}:{hashlib.sha256(f.read()).hexdigest()}'
+
+
+def load_model(path=SPINE_CHART_PATH, cache_path=MODEL_CACHE_PATH, refit=False, previous=None):
+    """Point weight models for a spine chart
+
+    Returned as is when previous (a SpineModel) or the cache was fit from
+    the same content. Otherwise the chart is read and fit incrementally from
+    previous or the cache, and the cache rewritten, so editing the chart
+    updates the model without a full refit. refit forces a full fit.
+    """
+    key = chart_key(path)
+    if previous is not None and previous.key == key and not refit:
+        return previous
+    if previous is None and not refit:
+        try:
+            with open(cache_path, encoding='utf-8') as f:
+                previous = SpineModel.from_json(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            previous = None
+        if previous is not None and previous.key == key:
+            return previous
+        # A cache of another model format can't seed an incremental fit
+        if previous is not None and previous.key.split(':')[0] != str(MODEL_FORMAT):
+            previous = None
+
+    model = fit_model(read_spine_chart(path), key, None if refit else previous)
+    try:
+        temporary = f'{cache_path}.{os.getpid()}'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(model.to_json(), f)
+        os.replace(temporary, cache_path)
+    except OSError:
+        pass
+    return model
+
+
+if __name__ == '__main__':
+    model = load_model(refit=True)
+    print(json.dumps({'models': model.models, 'ibo': model.ibo}, indent=1))
@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from catalog import CatalogIndex
+from regression import SpineModel
+
+# Get the directory where this script is located
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Compiled dataset snapshots: one directory per dataset version and a
+# CURRENT file naming the latest (python dataset.py builds it)
+SNAPSHOT_DIR = os.path.join(BASE_DIR, 'dataset_snapshot')
+
+# Bumped when the snapshot's layout changes, invalidating older snapshots
+SNAPSHOT_FORMAT = 1
+
+
+def write_snapshot(catalogIndex, spineModel, catalogKey, directory=SNAPSHOT_DIR):
+    """Compile a catalog index and spine model into a snapshot directory
+
+    Every array of the index goes to its own .npy file (strings dictionary
+    encoded, so there are no object arrays) and the fitted models, the keys
+    of the source files and the array names to meta.json. The version is
+    written to a temporary directory and renamed into place before CURRENT
+    is switched to it, so readers never see a partial snapshot. Older
+    versions are removed; processes that still map them keep their pages.
+    Returns the version's directory.
+    """
+    name = f'{catalogKey[:16]}-{spineModel.key.split(":")[-1][:16]}'
+    target = os.path.join(directory, name)
+    if not os.path.isdir(target):
+        os.makedirs(directory, exist_ok=True)
+        temporary = f'{target}.{os.getpid()}'
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        arrays = catalogIndex.arrays()
+        for array, values in arrays.items():
+            np.save(os.path.join(temporary, f'{array}.npy'), np.ascontiguousarray(values), allow_pickle=False)
+        with open(os.path.join(temporary, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': SNAPSHOT_FORMAT,
+                'catalogKey': catalogKey,
+                'spineModel': spineModel.to_json(),
+                'arrays': sorted(arrays)
+            }, f)
+        try:
+            os.rename(temporary, target)
+        except OSError:
+            # Another process compiled the same version first
+            shutil.rmtree(temporary, ignore_errors=True)
+
+    current = os.path.join(directory, 'CURRENT')
+    with open(f'{current}.{os.getpid()}', 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(f'{current}.{os.getpid()}', current)
+    for entry in os.listdir(directory):
+        if entry not in (name, 'CURRENT') and '.' not in entry:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    return target
+
+
+def load_snapshot(catalogKey, chartKey, directory=SNAPSHOT_DIR):
+    """Catalog index and spine model of the current snapshot, memory-mapped
+
+    Returns (catalogIndex, spineModel), or None if there is no snapshot or
+    it was compiled from other file contents (catalogKey and chartKey, see
+    dataset.file_key and regression.chart_key) or by another format. The
+    arrays are mapped read-only, so their pages come from the page cache and
+    are shared by every process that maps the same snapshot.
+    """
+    try:
+        with open(os.path.join(directory, 'CURRENT'), encoding='utf-8') as f:
+            target = os.path.join(directory, f.read().strip())
+        with open(os.path.join(target, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta.get('format') != SNAPSHOT_FORMAT or meta['catalogKey'] != catalogKey or
+                meta['spineModel']['key'] != chartKey):
+            return None
+        arrays = {array: np.load(os.path.join(target, f'{array}.npy'), mmap_mode='r', allow_pickle=False)
+                  for array in meta['arrays']}
+        return CatalogIndex.from_arrays(arrays), SpineModel.from_json(meta['spineModel'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
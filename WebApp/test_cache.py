@@ -0,0 +1,24 @@
+"""Checks of the LRU cache bounds"""
+import numpy as np
+
+from cache import LRUCache
+from calculator import result_nbytes
+
+
+def test_cache_evicts_by_bytes():
+    cache = LRUCache(10, maxbytes=2000, sizeof=result_nbytes)
+
+    for key in range(3):
+        cache.get_or_compute(key, lambda: {'values': np.zeros(100)})
+
+    stats = cache.stats()
+    assert (stats['size'], stats['bytes'], stats['evictions']) == (2, 1600, 1)
+
+
+def test_cache_skips_values_over_the_byte_bound():
+    cache = LRUCache(10, maxbytes=2000, sizeof=result_nbytes)
+
+    value = cache.get_or_compute('large', lambda: {'values': {'nested': np.zeros(1000)}})
+
+    assert value['values']['nested'].size == 1000
+    assert (cache.stats()['size'], cache.stats()['bytes']) == (0, 0)
@@ -0,0 +1,67 @@
+"""Checks of the binary typed-array encoding and the JSON payloads"""
+import json
+
+import numpy as np
+import pytest
+
+from app_plotly import app
+from encoding import decode_binary, encode_binary, to_builtin
+
+
+def test_binary_encoding_round_trip():
+    rng = np.random.default_rng(0)
+    payload = {
+        'success': True,
+        'calcPoundage': np.linspace(40, 80, 31),
+        'bands': {'calcFPS': rng.normal(300, 10, (31, 5)), 'empty': np.empty((0, 3))},
+        'series': [np.array([np.nan, np.inf, -0.0, 1e-300]), 'label', 7],
+        'counts': np.arange(4),
+        'selected': np.float64(1.5)
+    }
+
+    decoded = decode_binary(encode_binary(payload))
+
+    assert decoded['success'] is True
+    np.testing.assert_array_equal(decoded['calcPoundage'], payload['calcPoundage'])
+    np.testing.assert_array_equal(decoded['bands']['calcFPS'], payload['bands']['calcFPS'])
+    assert decoded['bands']['empty'].shape == (0, 3)
+    np.testing.assert_array_equal(decoded['series'][0], payload['series'][0])
+    assert np.signbit(decoded['series'][0][2])
+    assert decoded['series'][1:] == ['label', 7]
+    assert decoded['counts'] == [0, 1, 2, 3]
+    assert decoded['selected'] == 1.5
+
+
+def test_binary_encoding_float32():
+    values = np.random.default_rng(1).normal(size=(3, 7))
+
+    decoded = decode_binary(encode_binary({'values': values}, dtype=np.float32))['values']
+
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, values.astype(np.float32))
+
+
+def strict_json(text):
+    """Parse JSON, rejecting the NaN/Infinity literals browsers can't parse"""
+    def reject(constant):
+        raise ValueError(f'{constant} in JSON')
+    return json.loads(text, parse_constant=reject)
+
+
+def test_non_finite_floats_become_null():
+    payload = {'array': np.array([1.5, np.nan, np.inf]), 'plain': float('nan'), 'nested': [float('-inf'), 2.0]}
+
+    assert to_builtin(payload) == {'array': [1.5, None, None], 'plain': None, 'nested': [None, 2.0]}
+
+
+@pytest.mark.parametrize('mode', [None, 'data'])
+def test_comparison_of_an_unphysical_setup_is_strict_json(mode):
+    # Far stiffer than this poundage needs: the optimal point weight, and so the
+    # arrow mass, is negative and the speeds come out NaN
+    setup = {'spine': 150, 'arrowGPI': 5, 'arrowLength': 31, 'poundage': 190, 'ibo': 360, 'poundageMax': 200}
+    client = app.test_client()
+
+    response = client.post('/calculate_comparison', json={'setup1': setup, 'mode': mode})
+
+    assert response.status_code == 200
+    strict_json(response.get_data(as_text=True))
@@ -0,0 +1,69 @@
+"""Checks of spine chart ingestion into a spine store"""
+import csv
+import os
+
+import pytest
+
+from ingest import CANONICAL_COLUMNS, SpineStore, ingest_chart, map_columns, read_store
+
+CHARTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def distinct_rows(path):
+    """Distinct canonical rows of a chart, read without the store"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        positions = map_columns(next(reader))
+        return {tuple(row[positions[column]].strip() if column == 'Shaft' else float(row[positions[column]])
+                      for column in CANONICAL_COLUMNS)
+                for row in reader if any(cell.strip() for cell in row)}
+
+
+def write_chart(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows([list(CANONICAL_COLUMNS)] + rows)
+
+
+def test_ingest_keeps_every_distinct_row_of_a_chart(tmp_path):
+    path = os.path.join(CHARTS_DIR, 'ArrowSpine.csv')
+    store = SpineStore(str(tmp_path))
+
+    report = ingest_chart(path, store)
+
+    assert report['invalid'] == 0
+    assert report['appended'] == len(distinct_rows(path))
+    assert report['conflicts'] == 0
+    assert read_store(str(tmp_path))[0]['rows'] == report['appended']
+
+
+def test_ingest_counts_duplicates_and_conflicts(tmp_path):
+    first, second = str(tmp_path / 'first.csv'), str(tmp_path / 'second.csv')
+    write_chart(first, [['Axis', 150, 29, 400, 38, 42, 40], ['Axis', 150, 29, 400, 43, 47, 45]])
+    write_chart(second, [['Axis', 150, 29, 400, 38, 42, 40], ['Axis', 150, 29, 400, 43, 47, 46],
+                         ['Axis', 150, 29, 400, 48, 52, 50]])
+    store = SpineStore(str(tmp_path / 'store'))
+
+    ingest_chart(first, store)
+    report = ingest_chart(second, store)
+
+    assert (report['appended'], report['duplicates'], report['conflicts']) == (1, 1, 1)
+    meta, columns = read_store(str(tmp_path / 'store'))
+    assert meta['rows'] == 3
+    assert columns['NominalPoundage'].tolist() == [40, 45, 50]
+
+
+def test_failed_chart_is_rolled_back(tmp_path):
+    good, bad = str(tmp_path / 'good.csv'), str(tmp_path / 'bad.csv')
+    write_chart(good, [['Axis', 150, 29, 400, 38, 42, 40]])
+    write_chart(bad, [['Bad', 150, 20 + i / 100, 400, 38, 42, 40] for i in range(2000)])
+    with open(bad, 'ab') as f:
+        f.write(b'\xff\xfe,150,30,400,38,42,40\n')
+    store = SpineStore(str(tmp_path / 'store'))
+
+    with pytest.raises(UnicodeDecodeError):
+        ingest_chart(bad, store, chunk_rows=50)
+    ingest_chart(good, store)
+
+    meta, _ = read_store(str(tmp_path / 'store'))
+    assert meta['rows'] == 1
+    assert 'Bad' not in meta['shafts']
@@ -0,0 +1,33 @@
+"""Checks of the flight integrator against the closed-form quadratic drag solution"""
+import numpy as np
+
+from integrator import integrate
+from physics import calculate_speed, calculate_time, integrate_flight, quadratic_drag
+
+
+def test_integrator_matches_closed_form():
+    """Dormand-Prince under constant-Cd quadratic drag agrees with v0*exp(-kx) and its time integral"""
+    v0 = np.linspace(220, 360, 8)
+    area, cd, mass = 4.2e-4, 2.0, np.linspace(350, 550, 8) / 7000
+    checkpoints = np.array([0, 20, 45.5, 60, 120, 180, 300.])[:, None]
+
+    velocity, time = integrate_flight(quadratic_drag, v0, area, cd, mass, checkpoints)
+
+    np.testing.assert_allclose(velocity, calculate_speed(v0, area, cd, mass, checkpoints), rtol=1e-9)
+    np.testing.assert_allclose(time, calculate_time(v0, area, cd, mass, checkpoints), rtol=1e-9, atol=1e-12)
+
+
+def test_integrator_returns_checkpoints_in_request_order():
+    v0 = np.array([300., 250.])
+    checkpoints = np.array([[180., 60.], [60., 180.], [120., 0.]])
+
+    velocity, _ = integrate_flight(quadratic_drag, v0, 4.2e-4, 2.0, 0.06, checkpoints)
+
+    np.testing.assert_allclose(velocity, calculate_speed(v0, 4.2e-4, 2.0, 0.06, checkpoints), rtol=1e-9)
+
+
+def test_integrator_may_finish_on_its_last_allowed_step():
+    """One step reaches the only checkpoint, so max_steps=1 is enough"""
+    out = integrate(lambda y, coefs: np.zeros_like(y), np.ones((1, 2)), {}, np.ones((1, 2)), max_steps=1)
+
+    np.testing.assert_array_equal(out, np.ones((1, 1, 2)))
@@ -0,0 +1,40 @@
+"""Checks that incremental refits of the point weight models equal full fits"""
+import numpy as np
+
+from regression import SPINE_CHART_PATH, fit_model, read_spine_chart
+
+
+def assert_same_model(model, expected):
+    assert model.names == expected.names
+    assert model.models == expected.models
+    assert model.groups == expected.groups
+    np.testing.assert_array_equal(model.coefficients, expected.coefficients)
+
+
+def test_incremental_refit_equals_full_fit():
+    data = read_spine_chart(SPINE_CHART_PATH)
+    previous = fit_model(data, 'before')
+
+    # Edit one row, drop another and add a row at a new arrow length
+    edited = {column: values.copy() for column, values in data.items()}
+    edited['NominalPoundage'][0] += 3
+    keep = np.arange(edited['spine'].size) != 5
+    edited = {column: values[keep] for column, values in edited.items()}
+    edited = {column: np.append(values, values[-1:]) for column, values in edited.items()}
+    edited['arrowLength'][-1] = 40.5
+
+    incremental = fit_model(edited, 'after', previous=previous)
+
+    assert_same_model(incremental, fit_model(edited, 'after'))
+    total = sum(len(groups) for groups in incremental.groups.values())
+    assert 0 < incremental.refitGroups < total
+
+
+def test_refit_of_unchanged_chart_reuses_every_group():
+    data = read_spine_chart(SPINE_CHART_PATH)
+    previous = fit_model(data, 'same')
+
+    model = fit_model(data, 'same', previous=previous)
+
+    assert model.refitGroups == 0
+    assert_same_model(model, previous)